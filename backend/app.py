@@ -1,13 +1,31 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 import redis
-import json
 import logging
+import os
+
+import codec
+import metrics
+import scraper
+from croma_store import (
+    QueryError, get_product, load_products, parse_price, price_history, query_products, recent_price_drops,
+)
+from driver_pool import prewarm_default_pool
+from events import EventHub
+from jobs import Job
+from response_cache import ResponseCache
+
+MAX_DROPS = 200
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+REFRESH_INTERVAL = int(os.environ.get("CROMA_REFRESH_INTERVAL", "21600"))  # seconds; 0 disables
+QUERY_PARAMS = ("search", "min_price", "max_price", "sort", "cursor", "limit", "fields")
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:8080"}})
+metrics.instrument(app)
 
 try:
     r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
@@ -17,26 +35,148 @@ except redis.ConnectionError as e:
     logging.error(f"Could not connect to Redis: {e}")
     r = None
 
+response_cache = ResponseCache(r, "croma")
+
+scrape_job = None
+event_hub = EventHub(r, "croma") if r else None
+if r:
+    scrape_job = Job(r, "croma_scraper", lambda: scraper.refresh(r), interval=REFRESH_INTERVAL, lock_timeout=900)
+
 @app.route("/products", methods=["GET"])
+@response_cache.cached
 def get_products():
     """
     This endpoint returns the list of scraped product details.
+
+    Without query parameters it returns the current products as a JSON
+    array; `stale=1` adds the ones no scrape source lists any more. Any of `search`, `min_price`/`max_price` (rupees), `sort`
+    (listing, price, -price), `limit`, `cursor` or `fields` (comma-separated)
+    switches to one page: `{"products", "count", "limit", "next_cursor"}`.
     """
     if not r:
         return jsonify({"error": "Could not connect to Redis"}), 503
 
+    if any(param in request.args for param in QUERY_PARAMS):
+        return query_products_page()
+
     try:
-        product_data_json = r.get("croma_products")
-        if product_data_json is None:
+        products = load_products(r, include_stale=include_stale())
+        if products is None:
             return jsonify({"message": "No product data found. Please run the scraper first."}), 404
-        
-        products = json.loads(product_data_json)
+
         return jsonify(products)
     except Exception as e:
         logging.error(f"An error occurred in /products endpoint: {e}")
         return jsonify({"error": "An internal server error occurred."}), 500
 
+def include_stale():
+    return request.args.get("stale", "") in ("1", "true")
+
+def query_products_page():
+    try:
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.args.get("limit", DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    bounds = {}
+    for name in ("min_price", "max_price"):
+        value = request.args.get(name, "").strip()
+        if value:
+            bounds[name] = parse_price(value)
+            if bounds[name] is None:
+                return jsonify({"error": f"{name} must be a number"}), 400
+
+    fields = request.args.get("fields", "").strip()
+    fields = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+
+    try:
+        products, total, next_cursor = query_products(
+            r,
+            search=request.args.get("search", "").strip(),
+            sort=request.args.get("sort", "listing").strip() or "listing",
+            cursor=request.args.get("cursor", "").strip() or None,
+            limit=limit,
+            fields=fields,
+            include_stale=include_stale(),
+            **bounds,
+        )
+        if products is None:
+            return jsonify({"message": "No product data found. Please run the scraper first."}), 404
+
+        return jsonify({"products": products, "count": total, "limit": limit, "next_cursor": next_cursor})
+    except QueryError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logging.error(f"An error occurred in /products endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
+
+@app.route("/products/stream", methods=["GET"])
+def stream_products():
+    """
+    Server-Sent Events: `product` events carry new products in full and
+    changed products as deltas; `removed` lists dropped product ids.
+    Reconnecting clients resume after their Last-Event-ID.
+    """
+    if not event_hub:
+        return jsonify({"error": "Could not connect to Redis"}), 503
+    return event_hub.response()
+
+@app.route("/products/<product_id>/history", methods=["GET"])
+@response_cache.cached
+def get_price_history(product_id):
+    """
+    Price history of one product; prices are integers in paise.
+    Optional `since` (unix seconds) and `limit` (newest points) narrow it.
+    """
+    if not r:
+        return jsonify({"error": "Could not connect to Redis"}), 503
+
+    try:
+        since = int(request.args["since"]) if "since" in request.args else None
+        limit = max(0, int(request.args["limit"])) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+
+    try:
+        product = get_product(r, product_id)
+        if product is None:
+            return jsonify({"message": f"Unknown product '{product_id}'."}), 404
+
+        return jsonify({
+            "id": product_id,
+            "title": product.get("title"),
+            "url": product.get("url"),
+            "history": price_history(r, product_id, since=since, limit=limit),
+        })
+    except Exception as e:
+        logging.error(f"An error occurred in /products/{product_id}/history endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
+
+@app.route("/price-drops", methods=["GET"])
+@response_cache.cached
+def get_price_drops():
+    """
+    Products whose sale price dropped most recently, newest first.
+    Optional `since` (unix seconds) and `limit` (default 50).
+    """
+    if not r:
+        return jsonify({"error": "Could not connect to Redis"}), 503
+
+    try:
+        since = int(request.args["since"]) if "since" in request.args else None
+        limit = min(MAX_DROPS, max(1, int(request.args.get("limit", 50))))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
+
+    try:
+        drops = recent_price_drops(r, since=since, limit=limit)
+        return jsonify({"drops": drops, "count": len(drops)})
+    except Exception as e:
+        logging.error(f"An error occurred in /price-drops endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
+
 @app.route("/scraped-content", methods=["GET"])
+@response_cache.cached
 def get_scraped_content():
     """
     TODO: Complete this endpoint.
@@ -46,26 +186,58 @@ def get_scraped_content():
         return jsonify({"error": "Could not connect to Redis"}), 503
 
     try:
-        # Retrieve the page elements data from Redis
-        page_elements_json = r.get("croma_page_elements")
-        
-        if page_elements_json is None:
+        # Retrieve and decode the page elements data from Redis
+        data = codec.load(r, "croma_page_elements")
+
+        if data is None:
             return jsonify({"message": "No page element data found. Please run the scraper first."}), 404
-        
-        # Parse the JSON string and return it
-        data = json.loads(page_elements_json)
+
         return jsonify({"success": True, "data": data})
-        
-    except json.JSONDecodeError:
+
+    except ValueError:
         return jsonify({"success": False, "message": "Failed to parse page element data from Redis."}), 500
     except Exception as e:
         logging.error(f"An error occurred in /scraped-content endpoint: {e}")
         return jsonify({"success": False, "message": f"An internal server error occurred: {str(e)}"}), 500
 
+@app.route("/refresh", methods=["POST"])
+def refresh_products():
+    """
+    Request a fresh scrape. Requests made while one is running are
+    coalesced into a single follow-up run.
+    """
+    if not scrape_job:
+        return jsonify({"error": "Could not connect to Redis"}), 503
+    try:
+        outcome = scrape_job.request("manual")
+        return jsonify({"outcome": outcome, "job": scrape_job.status()}), 202
+    except Exception as e:
+        logging.error(f"An error occurred in /refresh endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred."}), 500
+
+@app.route("/jobs", methods=["GET"])
+def get_jobs():
+    """Status of the scraper job: state, last run timings and result, counters."""
+    if not scrape_job:
+        return jsonify({"error": "Could not connect to Redis"}), 503
+    return jsonify({"jobs": [scrape_job.status()]})
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus metrics: scraper stage timings, item/error/cache counters, request latency."""
+    return metrics.response()
+
 @app.route("/", methods=["GET"])
 def health_check():
     """Health check endpoint to confirm the backend is running."""
     return jsonify({"status": "healthy", "message": "Backend is running!"})
 
 if __name__ == "__main__":
+    # The browser pool and the schedule start only here, not on import
+    # (replay, tests, other tools import the app), and under the debug
+    # reloader only in the child process that serves requests.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        prewarm_default_pool()
+        if scrape_job:
+            scrape_job.start_periodic()
     app.run(debug=True, port=5000)
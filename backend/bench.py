@@ -0,0 +1,710 @@
+"""
+Offline micro-benchmarks for the backend hot paths.
+
+    python bench.py search --sizes 10000 100000
+    python bench.py categorize --size 50000
+    python bench.py dedupe --sizes 1000 10000 50000
+    python bench.py extract [--fixture fixtures/croma_listing.html ...]
+    python bench.py products --sizes 1000 20000   # needs Redis; flushes --redis-db
+    python bench.py codec
+    python bench.py sse --clients 200 --events 50           # needs Redis; flushes --redis-db
+    python bench.py pipeline --sources 100 500
+    python bench.py modes [--fixture ...]      # needs Chrome
+    python bench.py blocking [--fixture ...]   # needs Chrome
+"""
+import argparse
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import codec
+import dedupe
+from categorizer import CATEGORY_KEYWORDS, Categorizer
+from croma_extract import BACKENDS, extract_page
+from search_index import SearchIndex
+
+WORDS = (
+    "pfizer novartis sanofi takeda merck bayer abbvie roche lilly astrazeneca amgen "
+    "drug approval fda launch trial phase study results data oncology vaccine "
+    "acquisition merger deal partnership earnings revenue quarterly guidance "
+    "conference summit congress patients therapy treatment market shares analyst "
+    "biotech pipeline cancer obesity diabetes antibody gene cell rare disease"
+).split()
+
+COMPANIES = ["Pfizer", "Novartis", "Sanofi", "Takeda", "Merck", "Bayer", "AbbVie", "Roche"]
+CATEGORIES = ["Drug Launch", "Innovation", "Events", "Acquisition", "Earnings", "General"]
+
+
+def synthetic_vocabulary(size=20000, seed=7):
+    """Pseudo-words with Zipf-like cumulative weights; the domain words sit
+    just below the head so they behave like real search terms, not stop words."""
+    rng = random.Random(seed)
+    filler = sorted({"".join(rng.choices("abcdefghijklmnoprstuvw", k=rng.randint(3, 10))) for _ in range(size)})
+    rng.shuffle(filler)
+    vocabulary = filler[:50] + WORDS + filler[50:]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    return vocabulary, cum_weights
+
+
+def synthetic_articles(n, seed=42):
+    rng = random.Random(seed)
+    vocabulary, cum_weights = synthetic_vocabulary()
+    now = time.time()
+    articles = []
+    for i in range(n):
+        articles.append({
+            "id": f"a{i}",
+            "company": rng.choice(COMPANIES),
+            "category": rng.choice(CATEGORIES),
+            "title": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=10)).capitalize(),
+            "summary": " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=40)),
+            "timestamp": now - rng.uniform(0, 14 * 86400),
+        })
+    return articles
+
+
+def _timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def bench_search(args):
+    queries = ["pfizer", "fda approval", "onco", "merger deal earnings", "gene therapy trial"]
+    for size in args.sizes:
+        articles = synthetic_articles(size)
+
+        build_ms, index = _timed(lambda: SearchIndex(articles), 1)
+        print(f"\n{size} articles — index build {build_ms:.1f} ms")
+        print(f"{'query':<26}{'scan ms':>10}{'index ms':>10}{'matches':>10}")
+
+        for query in queries:
+            needle = query.lower()
+
+            def scan():
+                # The old /news?search= path: substring test on every article.
+                return [a for a in articles if needle in a["title"].lower() or needle in a["summary"].lower()]
+
+            scan_ms, _ = _timed(scan, args.repeat)
+            index_ms, (_, total) = _timed(lambda: index.search(query, limit=args.limit), args.repeat)
+            print(f"{query:<26}{scan_ms:>10.2f}{index_ms:>10.2f}{total:>10}")
+
+
+def near_duplicate_corpus(n, duplicate_share=0.2, seed=11):
+    """Synthetic headlines where `duplicate_share` are light rewrites of an earlier one."""
+    rng = random.Random(seed)
+    vocabulary, cum_weights = synthetic_vocabulary()
+    articles, origin = [], {}
+    for i in range(n):
+        if articles and rng.random() < duplicate_share:
+            source = rng.randrange(len(articles))
+            words = articles[source]["title"].split()
+            # Syndicated copies gain or lose a word or two, never the lead entity.
+            for _ in range(rng.randint(0, 2)):
+                if rng.random() < 0.5 and len(words) > 6:
+                    del words[rng.randrange(1, len(words))]
+                else:
+                    words.insert(rng.randrange(1, len(words) + 1), rng.choice(WORDS))
+            origin[i] = origin.get(source, source)
+            title = " ".join(words)
+        else:
+            title = rng.choice(COMPANIES) + " " + " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=9))
+        articles.append({"title": title, "summary": "", "source": rng.choice(["Reuters", "STAT", "CNBC"])})
+    return articles, origin
+
+
+def bench_dedupe(args):
+    for size in args.sizes:
+        articles, origin = near_duplicate_corpus(size)
+        fingerprints = [dedupe.fingerprint(article) for article in articles]
+
+        index = dedupe.NearDuplicateIndex()
+        candidates = found = 0
+        started = time.perf_counter()
+        for i, fp in enumerate(fingerprints):
+            keys = set()
+            for bucket in dedupe.lsh_buckets(fp):
+                keys |= index.buckets.get(bucket, set())
+            candidates += len(keys)
+            match = dedupe.closest(fp, ((key, index.fingerprints[key]) for key in keys))
+            found += match is not None and i in origin
+            index.add(i, fp)
+        lsh_ms = (time.perf_counter() - started) * 1000
+
+        # The brute-force alternative compares each article with every earlier one.
+        sample = range(max(0, size - args.scan_sample), size)
+        started = time.perf_counter()
+        for i in sample:
+            dedupe.closest(fingerprints[i], ((j, fingerprints[j]) for j in range(i)))
+        scan_ms = (time.perf_counter() - started) * 1000 / len(sample)
+
+        print(f"{size:>8} articles: LSH {lsh_ms / size:.3f} ms/article, {candidates / size:.1f} candidates/lookup, "
+              f"recall {found / max(1, len(origin)):.1%}; brute force {scan_ms:.2f} ms/article at the end")
+
+
+def _legacy_categorize(title, summary=""):
+    text = (title + " " + summary).lower()
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        if any(kw in text for kw in keywords):
+            return category
+    return "General"
+
+
+def _legacy_scores(title, summary=""):
+    # What the old approach costs once it must report every category.
+    text = (title + " " + summary).lower()
+    return {category: sum(text.count(kw) for kw in keywords) for category, keywords in CATEGORY_KEYWORDS.items()}
+
+
+def bench_categorize(args):
+    """
+    Time the word-lookup matcher against the old keyword loop and break down
+    where their labels differ. Pinned labels are checked by `replay.py run`
+    (fixtures/categories.json), not here.
+    """
+    categorizer = Categorizer()
+    articles = synthetic_articles(args.size)
+    legacy_ms, legacy = _timed(lambda: [_legacy_categorize(a["title"], a["summary"]) for a in articles], args.repeat)
+    legacy_all_ms, _ = _timed(lambda: [_legacy_scores(a["title"], a["summary"]) for a in articles], args.repeat)
+    single_ms, single = _timed(lambda: [categorizer.categorize(a["title"], a["summary"]) for a in articles], args.repeat)
+    batch_ms, batch = _timed(lambda: categorizer.categorize_batch(articles), args.repeat)
+
+    assert single == batch, "batch and per-article labels differ"
+    causes = {"legacy substring hit inside another word": 0, "higher score beats first hit": 0, "new whole-word match": 0}
+    for article, old, new in zip(articles, legacy, single):
+        if old == new:
+            continue
+        if old == "General":
+            causes["new whole-word match"] += 1
+        elif old in categorizer.scores(article["title"], article["summary"]):
+            causes["higher score beats first hit"] += 1
+        else:
+            causes["legacy substring hit inside another word"] += 1
+
+    agreement = sum(old == new for old, new in zip(legacy, single)) / len(articles)
+    print(f"{args.size} articles")
+    print(f"{'legacy, first hit':<24}{legacy_ms:>10.1f} ms")
+    print(f"{'legacy, all categories':<24}{legacy_all_ms:>10.1f} ms")
+    print(f"{'word lookup':<24}{single_ms:>10.1f} ms")
+    print(f"{'word lookup, batch':<24}{batch_ms:>10.1f} ms")
+    print(f"Label agreement with legacy: {agreement:.1%}")
+    for cause, count in causes.items():
+        print(f"  {cause:<42}{count:>6}")
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+BRANDS = ["Samsung", "LG", "Sony", "Croma", "Xiaomi", "OnePlus", "TCL", "Vu", "boAt", "JBL"]
+PRODUCT_KINDS = ["4K Ultra HD Smart LED TV", "QLED Google TV", "Soundbar with Subwoofer",
+                 "Wall Mount", "Streaming Stick", "HDMI Cable", "OLED evo TV", "Bluetooth Speaker"]
+
+
+def synthetic_listing_html(n_products, seed=1):
+    """
+    A Croma-like listing page: a heavy <head>, the site <header> and
+    `n_products` `li.product-item` cards, some still showing the lazy-load
+    placeholder or without any usable image.
+    """
+    rng = random.Random(seed)
+    head = "".join(
+        f'<meta name="m{i}" content="{"x" * 60}"><script src="https://assets.croma.com/js/chunk-{i}.js"></script>'
+        f'<style>.c{i}{{margin:{i}px;padding:{i}px}}</style>'
+        for i in range(150)
+    )
+    header = "".join(f'<li class="nav-item"><a href="/c/{i}">Category {i}</a></li>' for i in range(60))
+
+    items = []
+    for i in range(n_products):
+        title = f"{rng.choice(BRANDS)} {rng.randint(80, 190)} cm ({rng.randint(32, 75)} inch) {rng.choice(PRODUCT_KINDS)}"
+        sale = rng.randint(999, 199999)
+        mrp = int(sale * rng.uniform(1.05, 1.6))
+        image = f"https://media-ik.croma.com/prod/https://media.croma.com/image/upload/v1/{i}.png"
+        roll = rng.random()
+        if roll < 0.7:
+            img = f'<img class="product-img" src="{image}" alt="{title}">'
+        elif roll < 0.9:
+            img = f'<img class="product-img" src="/assets/images/lazyLoading.gif" data-src="{image}" alt="{title}">'
+        else:
+            img = '<img class="product-img" src="/assets/images/lazyLoading.gif" alt="">'
+        prices = f'<span class="amount plp-srp-new-amount">₹{sale:,}</span>'
+        if rng.random() < 0.85:
+            prices += f'<span class="old-price">MRP <span class="amount">₹{mrp:,}</span></span>'
+        items.append(
+            f'<li class="product-item"><div class="product-img plp-card-thumbnail">'
+            f'<a href="/product/p/{100000 + i}">{img}</a></div>'
+            f'<div class="product-info"><h3 class="product-title plp-prod-title">'
+            f'<a href="/product/p/{100000 + i}">{title}</a></h3>'
+            f'<div class="price-wrap">{prices}</div>'
+            f'<div class="cp-rating"><span class="rating-text">{rng.uniform(3, 5):.1f}</span></div></div></li>'
+        )
+
+    return (
+        f'<!DOCTYPE html><html lang="en"><head><title>Televisions &amp; Accessories | Croma</title>{head}</head>'
+        f'<body><header id="header"><nav><ul>{header}</ul></nav></header>'
+        f'<main><ul class="product-list">{"".join(items)}</ul></main><footer>Croma</footer></body></html>'
+    )
+
+
+def bench_extract(args):
+    pages = {}
+    for path in _fixture_pages(args.fixture):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    for size in args.synthetic:
+        pages[f"synthetic-{size}"] = synthetic_listing_html(size)
+
+    print(f"{'page':<28}{'KB':>8}" + "".join(f"{name + ' ms':>16}" for name in BACKENDS) + f"{'products':>10}")
+    for name, html in pages.items():
+        timings = []
+        outputs = {}
+        for backend in BACKENDS:
+            ms, (products, _) = _timed(lambda: extract_page(html, backend=backend), args.repeat)
+            timings.append(ms)
+            outputs[backend] = products
+        reference = outputs["bs4"]
+        mismatched = [backend for backend, products in outputs.items() if products != reference]
+        print(f"{name:<28}{len(html) / 1024:>8.0f}" + "".join(f"{ms:>16.2f}" for ms in timings) + f"{len(reference):>10}")
+        for backend in mismatched:
+            print(f"  MISMATCH: {backend} output differs from bs4")
+
+
+def synthetic_products(n, seed=3):
+    """Scraped-product dicts shaped like the extractor's output."""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        sale = rng.randint(999, 199999)
+        products.append({
+            "title": f"{rng.choice(BRANDS)} {rng.randint(80, 190)} cm ({rng.randint(32, 75)} inch) {rng.choice(PRODUCT_KINDS)}",
+            "sale_price": f"₹{sale:,}",
+            "price": f"₹{int(sale * rng.uniform(1.05, 1.6)):,}",
+            "image_url": f"https://media-ik.croma.com/prod/https://media.croma.com/image/upload/v1/{i}.png",
+            "url": f"https://www.croma.com/product/p/{100000 + i}",
+        })
+    return products
+
+
+def bench_products(args):
+    """Whole-catalog /products vs. one indexed page, as the catalog grows."""
+    import redis
+    from croma_store import ingest_products, load_products, query_products
+
+    r = redis.Redis(host=args.redis_host, port=6379, db=args.redis_db, decode_responses=True)
+    queries = {
+        "full array": lambda: load_products(r),
+        "page, listing": lambda: query_products(r, limit=args.limit)[0],
+        "page, price range": lambda: query_products(r, min_price=1000000, max_price=5000000, sort="price", limit=args.limit)[0],
+        "page, -price, 2 fields": lambda: query_products(r, sort="-price", limit=args.limit, fields=["title", "sale_price"])[0],
+        "page, search": lambda: query_products(r, search="oled tv", limit=args.limit)[0],
+    }
+    for size in args.sizes:
+        r.flushdb()
+        ingest_ms, _ = _timed(lambda: ingest_products(r, synthetic_products(size)), 1)
+        print(f"\n{size} products — ingest {ingest_ms:.0f} ms")
+        print(f"{'query':<26}{'ms':>10}{'KB':>10}")
+        for name, query in queries.items():
+            query()  # warm the in-process catalog index
+            ms, products = _timed(query, args.repeat)
+            print(f"{name:<26}{ms:>10.2f}{len(json.dumps(products)) / 1024:>10.1f}")
+    r.flushdb()
+
+
+def _peak_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def bench_codec(args):
+    """Encode/decode time, stored size and peak memory per codec."""
+    _, page_elements = extract_page(synthetic_listing_html(args.page_products))
+    payloads = {
+        "croma_page_elements": page_elements,
+        f"croma_products x{args.products}": synthetic_products(args.products),
+        f"pharma_news x{args.articles}": synthetic_articles(args.articles),
+    }
+    codecs = {"legacy json.dumps": (lambda obj: json.dumps(obj).encode("utf-8"), json.loads)}
+    for name in codec.available_codecs():
+        codecs[name] = (functools.partial(codec.encode, codec=name), codec.decode)
+
+    print(f"JSON library: {'orjson' if codec.orjson else 'stdlib json'}")
+    for label, obj in payloads.items():
+        print(f"\n{label}")
+        print(f"{'codec':<20}{'KB stored':>11}{'encode ms':>11}{'decode ms':>11}{'peak KB':>10}")
+        for name, (encode, decode) in codecs.items():
+            encode_ms, payload = _timed(lambda: encode(obj), args.repeat)
+            decode_ms, decoded = _timed(lambda: decode(payload), args.repeat)
+            peak = _peak_kb(lambda: decode(encode(obj)))
+            assert decoded == json.loads(json.dumps(obj)), f"{name} did not round-trip {label}"
+            print(f"{name:<20}{len(payload) / 1024:>11.1f}{encode_ms:>11.2f}{decode_ms:>11.2f}{peak:>10.0f}")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] if ordered else float("nan")
+
+
+def _sse_client(url, expected, received, byte_counts, index, last_event_id=None, stop_after=None):
+    """Read one SSE stream until `expected` events arrived; returns the last event id."""
+    import requests
+
+    headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+    event_id = last_event_id
+    with requests.get(url, headers=headers, stream=True, timeout=60) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            byte_counts[index] += len(line) + 1
+            if line.startswith("id: "):
+                event_id = line[4:]
+            elif line.startswith("data: ") and event_id and event_id != last_event_id:
+                data = json.loads(line[6:])
+                if "sent" in data:
+                    received[index].append((data["seq"], time.time() - data["sent"]))
+                    if len(received[index]) >= expected or len(received[index]) == stop_after:
+                        return event_id
+    return event_id
+
+
+def bench_sse(args):
+    """Many SSE subscribers on one EventHub: delivery latency, bytes, and Last-Event-ID resume."""
+    import redis
+    from flask import Flask
+    from werkzeug.serving import make_server
+
+    from events import EventHub, add_events
+
+    r = redis.Redis(host=args.redis_host, port=6379, db=args.redis_db, decode_responses=True)
+    r.flushdb()
+    hub = EventHub(r, "bench", heartbeat=2)
+    app = Flask("sse-bench")
+    app.add_url_rule("/stream", "stream", hub.response)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/stream"
+
+    articles = synthetic_articles(args.events)
+    received = [[] for _ in range(args.clients)]
+    byte_counts = [0] * args.clients
+    threads = []
+    for i in range(args.clients):
+        # Client 0 drops its connection halfway and resumes with Last-Event-ID.
+        if i == 0:
+            def resuming_client():
+                last = _sse_client(url, args.events, received, byte_counts, 0, stop_after=args.events // 2)
+                _sse_client(url, args.events, received, byte_counts, 0, last_event_id=last)
+            target = resuming_client
+        else:
+            target = functools.partial(_sse_client, url, args.events, received, byte_counts, i)
+        threads.append(threading.Thread(target=target, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    deadline = time.time() + 30
+    while hub.clients < args.clients and time.time() < deadline:
+        time.sleep(0.05)
+    print(f"{hub.clients} subscribers connected")
+
+    started = time.time()
+    for seq, article in enumerate(articles):
+        pipe = r.pipeline(transaction=True)
+        add_events(pipe, "bench", [("article", dict(article, seq=seq, sent=time.time()))])
+        pipe.execute()
+        time.sleep(args.interval / 1000)
+    for thread in threads:
+        thread.join(timeout=30)
+    elapsed = time.time() - started
+    server.shutdown()
+
+    latencies = [latency * 1000 for events in received for _, latency in events]
+    complete = sum(1 for events in received if len(events) >= args.events)
+    resumed = sorted(seq for seq, _ in received[0])
+    full_payload = len(json.dumps(articles))
+    print(f"{args.events} events in {elapsed:.1f}s to {args.clients} clients: "
+          f"{complete}/{args.clients} received every event")
+    print(f"latency ms  p50 {_percentile(latencies, 50):.1f}  p95 {_percentile(latencies, 95):.1f}  "
+          f"max {max(latencies, default=float('nan')):.1f}")
+    print(f"resumed client: {len(resumed)} events, gaps: {resumed != list(range(args.events))}")
+    print(f"bytes per client: {sum(byte_counts) / args.clients / 1024:.1f} KB streamed vs. "
+          f"{full_payload * args.events / 1024:.1f} KB polling the full list once per event")
+    r.flushdb()
+
+
+def _fixture_pages(paths):
+    return paths or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+
+
+def bench_modes(args):
+    """Load fixture pages in Chrome and compare in-browser extraction with page_source parsing."""
+    from croma_extract import extract_in_browser
+    from driver_pool import WebDriverPool
+
+    pool = WebDriverPool(size=1)
+    failures = 0
+    try:
+        with pool.session() as driver:
+            for path in _fixture_pages(args.fixture):
+                driver.get("file://" + os.path.abspath(path))
+
+                browser_ms, (browser_products, _) = _timed(lambda: extract_in_browser(driver), args.repeat)
+
+                def via_page_source():
+                    return extract_page(driver.page_source)
+
+                html_ms, (html_products, _) = _timed(via_page_source, args.repeat)
+                same = browser_products == html_products
+                failures += not same
+                print(f"{os.path.basename(path):<28} browser {browser_ms:>8.2f} ms   page_source+parse {html_ms:>8.2f} ms"
+                      f"   {len(browser_products)} products   {'match' if same else 'MISMATCH'}")
+    finally:
+        pool.close()
+
+    if failures:
+        raise SystemExit(1)
+
+
+class _LocalCromaHandler(BaseHTTPRequestHandler):
+    """Serves one fixture page plus fake images, fonts and an analytics script."""
+
+    page = b""
+    asset_bytes = 64 * 1024
+    asset_delay = 0.05
+    served = {"requests": 0, "bytes": 0}
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.path.startswith("/page"):
+            body, content_type = self.page, "text/html; charset=utf-8"
+        else:
+            time.sleep(self.asset_delay)
+            body = b"\0" * self.asset_bytes
+            content_type = "application/octet-stream"
+        with self.lock:
+            self.served["requests"] += 1
+            self.served["bytes"] += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _localize(html, base):
+    """Point a fixture page's images at the local server and add fonts and a tracker."""
+    # Asset URLs keep query strings like the live site's (ImageKit "?tr=w-…",
+    # cache-busting "?v="), so URL-pattern blocking is tested against real shapes.
+    html = re.sub(r"https://media-ik\.croma\.com/[^\"]+?/(\d+)\.png(\?[^\"]*)?",
+                  lambda m: f"{base}/img/{m.group(1)}.png{m.group(2) or '?tr=w-400'}", html)
+    html = html.replace("/assets/images/lazyLoading.gif", f"{base}/assets/lazyLoading.gif?v=2")
+    extras = (
+        f'<style>@font-face{{font-family:x;src:url({base}/fonts/a.woff2?v=3)}} body{{font-family:x}}</style>'
+        f'<script async src="{base}/www.googletagmanager.com/gtm.js"></script>'
+    )
+    return html.replace("</head>", extras + "</head>", 1)
+
+
+def _blocked(url, patterns):
+    """Whether Chrome's Network.setBlockedURLs would block `url`: `*` wildcards, whole-URL match."""
+    return any(re.fullmatch(".*".join(map(re.escape, pattern.split("*"))), url) for pattern in patterns)
+
+
+def blocking_coverage(html, patterns):
+    """`(blocked, total)` over the image and font URLs referenced by a page."""
+    urls = set(re.findall(r"""(?:src|data-src|href)=["']([^"']+)["']|url\(([^)]+)\)""", html))
+    urls = {a or b for a, b in urls}
+    urls = {url for url in urls if re.search(r"\.(png|jpe?g|gif|webp|svg|woff2?)(\?|$)", url)}
+    return sum(_blocked(url, patterns) for url in urls), len(urls)
+
+
+def bench_blocking(args):
+    """Scrape a locally served copy of each fixture with and without resource blocking."""
+    import driver_pool
+    from scraper import scrape_croma_data
+    from timing import PhaseTimer
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _LocalCromaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    _LocalCromaHandler.asset_delay = args.asset_delay / 1000
+
+    try:
+        for path in _fixture_pages(args.fixture):
+            with open(path, encoding="utf-8") as f:
+                _LocalCromaHandler.page = _localize(f.read(), base).encode("utf-8")
+            covered, total = blocking_coverage(_LocalCromaHandler.page.decode("utf-8"), driver_pool.BLOCKED_URL_PATTERNS)
+            print(f"\n{os.path.basename(path)}: {covered}/{total} asset URLs match BLOCKED_URL_PATTERNS")
+            for blocked in (False, True):
+                pool = driver_pool.WebDriverPool(size=1, factory=functools.partial(driver_pool.new_driver, blocked))
+                try:
+                    pool.prewarm()
+                    _LocalCromaHandler.served.update(requests=0, bytes=0)
+                    timer = PhaseTimer()
+                    products, _ = scrape_croma_data(f"{base}/page.html", pool=pool, timer=timer)
+                    served = dict(_LocalCromaHandler.served)
+                finally:
+                    pool.close()
+                print(f"  blocking {'on ' if blocked else 'off'}: {timer.total():6.2f}s total "
+                      f"(page_load {timer.phases.get('page_load', 0):.2f}s, lazy_load {timer.phases.get('lazy_load', 0):.2f}s), "
+                      f"{served['requests']} requests, {served['bytes'] / 1024:.0f} KB, {len(products)} products")
+    finally:
+        server.shutdown()
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    """Serves a fixture feed for any query, with links made unique per query."""
+
+    feeds = []
+    delay = 0.02
+
+    def do_GET(self):
+        query = self.path.strip("/").rsplit(".", 1)[0]
+        feed = self.feeds[int(hashlib.md5(query.encode()).hexdigest(), 16) % len(self.feeds)]
+        body = feed.replace(b"</link>", b"?q=" + query.encode() + b"</link>")
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def bench_pipeline(args):
+    """Fetch-everything-then-parse vs. the streaming ingest pipeline over many sources."""
+    import feedparser
+
+    import pharma_scraper
+    import sources
+    from feed_fetcher import fetch_all
+
+    _FeedHandler.feeds = []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "feeds", "*.xml"))):
+        with open(path, "rb") as f:
+            _FeedHandler.feeds.append(f.read())
+    _FeedHandler.delay = args.latency / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    template = f"http://127.0.0.1:{server.server_port}/{{query}}.xml"
+    fetch = dict(rate=0, per_host=args.per_host, total_connections=args.per_host)
+
+    print(f"{'sources':>8}{'mode':>12}{'s':>9}{'feeds/s':>10}{'peak KB':>10}{'articles':>10}")
+    try:
+        for n in args.sources:
+            source_list = [sources.Source(f"Company {i:04d}") for i in range(n)]
+
+            def gather():
+                seen = set()
+                stories = dedupe.NearDuplicateIndex()
+                taken = 0
+                results = fetch_all([source.feed_url(template) for source in source_list], **fetch)
+                for source, result in zip(source_list, results):
+                    items = pharma_scraper.parse_feed_entries(source.name, feedparser.parse(result.body))
+                    taken += len(pharma_scraper.take_unseen(items, seen, source.max_articles, stories))
+                return taken
+
+            def pipeline():
+                taken = [0]
+
+                def store(source, items):
+                    taken[0] += len(items)
+
+                pharma_scraper.stream_pharma_news(source_list, store, feed_url_template=template, **fetch)
+                return taken[0]
+
+            for mode, fn in (("gather", gather), ("pipeline", pipeline)):
+                started = time.perf_counter()
+                articles = fn()
+                seconds = time.perf_counter() - started
+                peak = _peak_kb(fn)
+                print(f"{n:>8}{mode:>12}{seconds:>9.2f}{n / seconds:>10.0f}{peak:>10.0f}{articles:>10}")
+    finally:
+        server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    search = sub.add_parser("search", help="inverted index vs. substring scan for /news?search=")
+    search.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    search.add_argument("--repeat", type=int, default=5)
+    search.add_argument("--limit", type=int, default=200, help="page size ranked by the index")
+    search.set_defaults(func=bench_search)
+
+    categorize = sub.add_parser("categorize", help="word-lookup categorizer vs. the old keyword loop: time and label changes")
+    categorize.add_argument("--size", type=int, default=50000)
+    categorize.add_argument("--repeat", type=int, default=3)
+    categorize.set_defaults(func=bench_categorize)
+
+    dedupe_parser = sub.add_parser("dedupe", help="LSH near-duplicate lookup vs. pairwise comparison")
+    dedupe_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    dedupe_parser.add_argument("--scan-sample", type=int, default=50, help="articles timed for the brute-force scan")
+    dedupe_parser.set_defaults(func=bench_dedupe)
+
+    extract = sub.add_parser("extract", help="Croma product extraction per parser backend")
+    extract.add_argument("--fixture", nargs="*", help="saved listing pages (default: fixtures/*.html)")
+    extract.add_argument("--synthetic", type=int, nargs="*", default=[500], help="synthetic pages with N products")
+    extract.add_argument("--repeat", type=int, default=5)
+    extract.set_defaults(func=bench_extract)
+
+    products = sub.add_parser("products", help="whole-catalog /products vs. indexed pages (needs Redis)")
+    products.add_argument("--sizes", type=int, nargs="+", default=[1000, 20000])
+    products.add_argument("--limit", type=int, default=50)
+    products.add_argument("--repeat", type=int, default=20)
+    products.add_argument("--redis-host", default="localhost")
+    products.add_argument("--redis-db", type=int, default=15, help="scratch database; it is flushed")
+    products.set_defaults(func=bench_products)
+
+    codec_parser = sub.add_parser("codec", help="Redis payload codecs: size, encode/decode time, memory")
+    codec_parser.add_argument("--page-products", type=int, default=500, help="products on the page whose <head>/<header> are encoded")
+    codec_parser.add_argument("--products", type=int, default=5000)
+    codec_parser.add_argument("--articles", type=int, default=2000)
+    codec_parser.add_argument("--repeat", type=int, default=10)
+    codec_parser.set_defaults(func=bench_codec)
+
+    sse = sub.add_parser("sse", help="SSE fan-out load test with many subscribers (needs Redis)")
+    sse.add_argument("--clients", type=int, default=200)
+    sse.add_argument("--events", type=int, default=50)
+    sse.add_argument("--interval", type=float, default=20, help="ms between published events")
+    sse.add_argument("--redis-host", default="localhost")
+    sse.add_argument("--redis-db", type=int, default=15, help="scratch database; it is flushed")
+    sse.set_defaults(func=bench_sse)
+
+    pipeline = sub.add_parser("pipeline", help="fetch-then-parse vs. the streaming pharma ingest pipeline")
+    pipeline.add_argument("--sources", type=int, nargs="+", default=[100, 500])
+    pipeline.add_argument("--latency", type=float, default=20, help="ms the local feed server waits per request")
+    pipeline.add_argument("--per-host", type=int, default=16, help="concurrent requests to the feed server")
+    pipeline.set_defaults(func=bench_pipeline)
+
+    modes = sub.add_parser("modes", help="in-browser vs. page_source extraction on fixtures (needs Chrome)")
+    modes.add_argument("--fixture", nargs="*", help="saved listing pages (default: fixtures/*.html)")
+    modes.add_argument("--repeat", type=int, default=5)
+    modes.set_defaults(func=bench_modes)
+
+    blocking = sub.add_parser("blocking", help="scrape a locally served fixture with/without resource blocking (needs Chrome)")
+    blocking.add_argument("--fixture", nargs="*", help="saved listing pages (default: fixtures/*.html)")
+    blocking.add_argument("--asset-delay", type=float, default=50, help="ms the local server waits per image/font")
+    blocking.set_defaults(func=bench_blocking)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
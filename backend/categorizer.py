@@ -0,0 +1,118 @@
+import re
+
+CATEGORY_KEYWORDS = {
+    "Drug Launch": ["launch", "launched", "approved", "approval", "fda approved", "new drug", "marketed", "clearance", "nda", "bla"],
+    "Innovation": ["discovery", "breakthrough", "innovation", "research", "researcher", "clinical trial", "phase 1", "phase 2", "phase 3", "study", "data", "results"],
+    "Events": ["conference", "event", "summit", "webinar", "meeting", "symposium", "congress", "asco", "aha", "esc"],
+    "Acquisition": ["acquisition", "acquires", "merger", "deal", "partnership", "collaboration", "agreement", "license"],
+    "Earnings": ["earnings", "revenue", "quarterly", "financial results", "q1", "q2", "q3", "q4", "guidance"]
+}
+
+DEFAULT_CATEGORY = "General"
+
+# Keywords match whole words plus their regular inflections ("launches",
+# "deals", "licensed", "launching"), so "nda" no longer fires inside
+# "Honda" or "agenda". Derived nouns such as "dealer" or "launcher" are not
+# inflections and do not match. Together with scoring every category, this
+# is why labels differ from the old first-substring-hit loop; `python
+# bench.py categorize` counts the articles affected by each cause.
+_SUFFIXES = ("s", "es", "d", "ed", "ing")
+
+# Words are runs of ASCII letters and digits; everything else separates
+# them. Splitting goes through bytes.translate, which is far cheaper than a
+# regex scan. Two-word keywords ("clinical trial") must be separated by
+# whitespace only, so texts where a pair shows up are re-split with _TOKEN_RE,
+# where any other character is a token of its own ("phase-1" is no match).
+_WORD_BYTES = frozenset(b"abcdefghijklmnopqrstuvwxyz0123456789")
+_SEPARATE = bytes(byte if byte in _WORD_BYTES else 0x20 for byte in range(256))
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[^a-z0-9\s]")
+
+
+class Categorizer:
+    """
+    Single-pass keyword categorizer.
+
+    Each text is split into words once, and every word (or pair of words,
+    for keywords like "clinical trial") is looked up in a dict of keywords
+    and their inflected forms, so the cost does not grow with the number of
+    keywords. Every hit adds one point to each category owning that keyword.
+    """
+
+    def __init__(self, category_keywords=CATEGORY_KEYWORDS, default=DEFAULT_CATEGORY):
+        self.default = default
+        self.order = {category: position for position, category in enumerate(category_keywords)}
+        owners = {}
+        for category, keywords in category_keywords.items():
+            for keyword in keywords:
+                owners.setdefault(tuple(keyword.lower().split()), []).append(category)
+
+        # Exact keywords first, so "launched" is its own keyword, not launch + "ed".
+        words = {}    # word -> owning categories
+        pairs = {}    # (first word, second word) -> owning categories
+        for with_suffixes in (False, True):
+            for keyword, categories in owners.items():
+                forms = [keyword[-1] + suffix for suffix in _SUFFIXES] if with_suffixes else [keyword[-1]]
+                for form in forms:
+                    if len(keyword) == 1:
+                        words.setdefault(form, categories)
+                    else:
+                        pairs.setdefault((keyword[0], form), categories)
+        self.words = {word.encode(): categories for word, categories in words.items()}
+        # A two-word keyword takes its second word's own hit ("fda approved"
+        # counts once, for the pair), so each pair also carries what to undo.
+        self.pairs = {pair: (categories, words.get(pair[1], ())) for pair, categories in pairs.items()}
+        self.firsts = frozenset(first.encode() for first, _ in pairs)
+        self.byte_pairs = frozenset((first.encode(), second.encode()) for first, second in pairs)
+
+    def _count(self, text):
+        text = text.lower()
+        tokens = text.encode("utf-8").translate(_SEPARATE).split()
+        scores = {}
+        # dict.get over map/filter keeps the per-word loop in C.
+        for categories in filter(None, map(self.words.get, tokens)):
+            for category in categories:
+                scores[category] = scores.get(category, 0) + 1
+        if not self.firsts.isdisjoint(tokens) and not self.byte_pairs.isdisjoint(zip(tokens, tokens[1:])):
+            tokens = _TOKEN_RE.findall(text)
+            for categories, undo in filter(None, map(self.pairs.get, zip(tokens, tokens[1:]))):
+                for category in categories:
+                    scores[category] = scores.get(category, 0) + 1
+                for category in undo:
+                    scores[category] -= 1
+        return {category: score for category, score in scores.items() if score > 0}
+
+    def _rank(self, scores):
+        """Categories by score, ties broken by CATEGORY_KEYWORDS order."""
+        if len(scores) < 2:
+            return scores
+        return dict(sorted(scores.items(), key=lambda item: (-item[1], self.order[item[0]])))
+
+    def scores(self, title, summary=""):
+        """Return `{category: hits}` for every matching category, best first."""
+        return self._rank(self._count(title + " " + summary))
+
+    def categorize(self, title, summary=""):
+        ranked = self.scores(title, summary)
+        return next(iter(ranked), self.default)
+
+    def scores_batch(self, articles):
+        """Score a list of article dicts (`title`/`summary`)."""
+        return [self.scores(article.get("title", ""), article.get("summary", "")) for article in articles]
+
+    def categorize_batch(self, articles):
+        return [next(iter(ranked), self.default) for ranked in self.scores_batch(articles)]
+
+
+_default = Categorizer()
+
+
+def category_scores(title, summary=""):
+    return _default.scores(title, summary)
+
+
+def categorize(title, summary=""):
+    return _default.categorize(title, summary)
+
+
+def categorize_batch(articles):
+    return _default.categorize_batch(articles)
@@ -0,0 +1,145 @@
+import gzip
+import json
+import logging
+import os
+import threading
+
+import redis
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    import orjson
+except ImportError:  # optional fast JSON
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # optional compression
+    zstandard = None
+
+# Encoded payloads start with MAGIC, a format version byte and a codec id
+# byte. JSON text never starts with NUL, so anything without the header is
+# a legacy plain `json.dumps` payload and still decodes.
+MAGIC = b"\x00RC"
+FORMAT_VERSION = 1
+CODEC_IDS = {"json": 0, "gzip": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+# "auto" compresses with zstd when installed, else gzip. Payloads below
+# COMPRESS_MIN_BYTES are stored as plain JSON behind the header.
+DEFAULT_CODEC = os.environ.get("REDIS_CODEC", "auto")
+COMPRESS_MIN_BYTES = int(os.environ.get("REDIS_CODEC_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+if zstandard is not None:
+    _zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    _zstd_decompressor = zstandard.ZstdDecompressor()
+
+
+def dumps(obj):
+    """Compact JSON as UTF-8 bytes, via orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from bytes or str, via orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def available_codecs():
+    codecs = ["json", "gzip"]
+    if zstandard is not None:
+        codecs.append("zstd")
+    return codecs
+
+
+def resolve_codec(codec=DEFAULT_CODEC):
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "gzip"
+    if codec not in available_codecs():
+        raise ValueError(f"Codec '{codec}' is not available (installed: {', '.join(available_codecs())})")
+    return codec
+
+
+def _compress(codec, body):
+    if codec == "gzip":
+        # mtime=0 keeps the output deterministic, so equal data encodes equally.
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if codec == "zstd":
+        return _zstd_compressor.compress(body)
+    return body
+
+
+def _decompress(codec, body):
+    if codec == "gzip":
+        return gzip.decompress(body)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("Payload is zstd-compressed but zstandard is not installed")
+        return _zstd_decompressor.decompress(body)
+    return body
+
+
+def encode(obj, codec=DEFAULT_CODEC):
+    """Serialize `obj` to a versioned, optionally compressed payload."""
+    body = dumps(obj)
+    codec = resolve_codec(codec)
+    if len(body) < COMPRESS_MIN_BYTES:
+        codec = "json"
+    return MAGIC + bytes((FORMAT_VERSION, CODEC_IDS[codec])) + _compress(codec, body)
+
+
+def decode(payload):
+    """Inverse of `encode`; also accepts legacy plain-JSON str/bytes payloads."""
+    if payload is None:
+        return None
+    if isinstance(payload, str) or not payload.startswith(MAGIC):
+        return loads(payload)
+
+    header_end = len(MAGIC) + 2
+    version, codec_id = payload[len(MAGIC)], payload[len(MAGIC) + 1]
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported payload format version {version}")
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f"Unknown payload codec id {codec_id}")
+    return loads(_decompress(CODEC_NAMES[codec_id], payload[header_end:]))
+
+
+_binary_lock = threading.Lock()
+_binary_clients = {}  # id(connection pool) -> (pool, bytes client)
+
+
+def binary_client(redis_client):
+    """
+    A client for the same server that returns raw bytes.
+
+    The apps and scrapers connect with `decode_responses=True`, which would
+    try to UTF-8 decode compressed payloads; encoded keys are read and
+    written through this client instead.
+    """
+    pool = redis_client.connection_pool
+    with _binary_lock:
+        cached = _binary_clients.get(id(pool))
+        if cached is None or cached[0] is not pool:
+            kwargs = dict(pool.connection_kwargs, decode_responses=False)
+            client = redis.Redis(connection_pool=redis.ConnectionPool(connection_class=pool.connection_class, **kwargs))
+            cached = _binary_clients[id(pool)] = (pool, client)
+        return cached[1]
+
+
+def store(redis_client, key, obj, codec=DEFAULT_CODEC):
+    """Encode `obj` and SET it; returns the stored size in bytes."""
+    payload = encode(obj, codec)
+    binary_client(redis_client).set(key, payload)
+    return len(payload)
+
+
+def load(redis_client, key):
+    """GET and decode `key`; None when it does not exist."""
+    return decode(binary_client(redis_client).get(key))
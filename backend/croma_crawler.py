@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import redis
+
+from croma_store import ingest_products, product_id
+from driver_pool import WebDriverPool
+from response_cache import bump_version
+from scraper import scrape_croma_data, store_in_redis
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_CATEGORY_URLS = [
+    "https://www.croma.com/televisions-accessories/c/997",
+]
+
+PAGE_PARAM = "page"
+CATEGORY_KEY_PREFIX = "croma_products:"
+CATEGORY_INDEX_KEY = "croma_categories"
+
+
+def category_slug(category_url):
+    """`https://www.croma.com/televisions-accessories/c/997` -> `televisions-accessories`."""
+    parts = [part for part in urlsplit(category_url).path.split("/") if part]
+    return parts[0] if parts else "unknown"
+
+
+def page_url(category_url, page):
+    """Listing URL for a zero-based page number; page 0 is the category URL itself."""
+    if page == 0:
+        return category_url
+    scheme, netloc, path, query, fragment = urlsplit(category_url)
+    params = [(k, v) for k, v in parse_qsl(query) if k != PAGE_PARAM] + [(PAGE_PARAM, str(page))]
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+
+class CrawlResult:
+    def __init__(self):
+        self.by_category = {}
+        self.combined = {}
+        self.page_elements = None
+        self.pages_ok = 0
+        self.pages_failed = 0
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def add_page(self, slug, products, page_elements):
+        """Record one page; returns how many products were new for this category."""
+        with self._lock:
+            self.pages_ok += 1
+            if self.page_elements is None and (page_elements.get("head") or page_elements.get("header")):
+                self.page_elements = page_elements
+
+            category = self.by_category.setdefault(slug, {})
+            new = 0
+            for product in products:
+                key = product_id(product)
+                if key in category:
+                    continue
+                new += 1
+                category[key] = product
+                if key in self.combined:
+                    self.combined[key].setdefault("categories", []).append(slug)
+                else:
+                    self.combined[key] = dict(product, category=slug, categories=[slug])
+            return new
+
+    def pages_per_minute(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return self.pages_ok / elapsed * 60 if elapsed > 0 else 0.0
+
+
+def crawl(category_urls, workers=2, max_pages=5, retries=2, pool=None):
+    """
+    Crawl every category listing and its following pages.
+
+    Pages are spread over `workers` threads sharing a pool of `workers`
+    browser sessions. Each category keeps up to `workers // categories`
+    pages in flight (at least one), speculatively fetching ahead, so a
+    single category still uses every worker. A category stops at the first
+    page that is empty or brings no products not seen before; pages already
+    fetched past that point are merged (they only repeat products) but do
+    not schedule more. Failed pages, including real page-load timeouts,
+    are retried up to `retries` times with backoff. A `pool` passed in is
+    left open for the caller; one created here is closed at the end.
+    """
+    owns_pool = pool is None
+    pool = pool or WebDriverPool(size=workers)
+    result = CrawlResult()
+    prefetch = max(1, workers // max(1, len(category_urls)))
+
+    def scrape_page(url, page, delay):
+        if delay:
+            time.sleep(delay)
+        # Past page 0 an empty listing is the end of the category, not an error.
+        return scrape_croma_data(url, pool=pool, raise_errors=True, allow_empty=page > 0)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="croma-crawl") as executor:
+            pending = {}
+            next_page = {}   # category URL -> next page number to submit
+            ended = set()    # categories whose listing has ended
+
+            def submit(category_url, page, attempt=0):
+                url = page_url(category_url, page)
+                # Retries back off inside the worker so the dispatcher keeps going.
+                future = executor.submit(scrape_page, url, page, 2 ** attempt if attempt else 0)
+                pending[future] = (category_url, page, attempt)
+
+            def submit_next(category_url):
+                page = next_page[category_url]
+                if category_url not in ended and page < max_pages:
+                    next_page[category_url] = page + 1
+                    submit(category_url, page)
+
+            for category_url in category_urls:
+                next_page[category_url] = 0
+                for _ in range(prefetch):
+                    submit_next(category_url)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    category_url, page, attempt = pending.pop(future)
+                    slug = category_slug(category_url)
+                    try:
+                        products, page_elements = future.result()
+                    except Exception as e:
+                        logging.warning(f"[{slug}] page {page} failed: {e}")
+                        if attempt < retries:
+                            logging.info(f"[{slug}] retrying page {page} (attempt {attempt + 2})")
+                            submit(category_url, page, attempt + 1)
+                        else:
+                            result.pages_failed += 1
+                            logging.error(f"[{slug}] giving up on page {page} after {attempt + 1} attempts")
+                            submit_next(category_url)
+                        continue
+
+                    if not products:
+                        logging.info(f"[{slug}] page {page} has no products; end of listing.")
+                        ended.add(category_url)
+                        continue
+
+                    new = result.add_page(slug, products, page_elements)
+                    logging.info(f"[{slug}] page {page}: {len(products)} products, {new} new")
+                    if not new:
+                        ended.add(category_url)
+                    submit_next(category_url)
+    finally:
+        result.finished = time.perf_counter()
+        if owns_pool:
+            pool.close()
+
+    logging.info(
+        f"Crawl finished: {result.pages_ok} pages ok, {result.pages_failed} failed, "
+        f"{len(result.combined)} unique products, {result.pages_per_minute():.1f} pages/min"
+    )
+    return result
+
+
+def store_crawl(r, result):
+    """Store per-category product lists, merge the deduped products into the catalog and index categories."""
+    scraped_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for slug, products in result.by_category.items():
+        store_in_redis(r, CATEGORY_KEY_PREFIX + slug, list(products.values()))
+        r.hset(CATEGORY_INDEX_KEY, slug, json.dumps({
+            "key": CATEGORY_KEY_PREFIX + slug,
+            "count": len(products),
+            "scraped_at": scraped_at,
+        }))
+
+    if result.combined:
+        sources = {f"category:{slug}": list(products) for slug, products in result.by_category.items()}
+        stats = ingest_products(r, list(result.combined.values()), sources=sources)
+        logging.info(f"Catalog: {stats['added']} added, {stats['updated']} updated, {stats['price_drops']} price drops")
+    if result.page_elements:
+        store_in_redis(r, "croma_page_elements", result.page_elements)
+    bump_version(r, "croma")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl Croma category listings into Redis.")
+    parser.add_argument("urls", nargs="*", default=DEFAULT_CATEGORY_URLS, help="category listing URLs")
+    parser.add_argument("--workers", type=int, default=2, help="parallel browser sessions")
+    parser.add_argument("--max-pages", type=int, default=5, help="pages to follow per category")
+    parser.add_argument("--retries", type=int, default=2, help="retries per failed page")
+    args = parser.parse_args()
+
+    crawl_result = crawl(args.urls, workers=args.workers, max_pages=args.max_pages, retries=args.retries)
+
+    try:
+        r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        r.ping()
+        store_crawl(r, crawl_result)
+    except redis.ConnectionError:
+        logging.error("Could not connect to Redis. Is the server running?")
+
+    logging.info("Crawl script finished.")
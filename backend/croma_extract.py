@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+from urllib.parse import urljoin
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:  # optional fast backend
+    HTMLParser = None
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # optional fast backend
+    lxml = None
+
+from bs4 import BeautifulSoup
+
+import metrics
+
+# Priority order for image attributes
+IMAGE_ATTRS = ('src', 'data-src', 'data-lazy-src', 'data-original', 'data-srcset')
+LAZY_PLACEHOLDER = 'lazyLoading.gif'
+PLACEHOLDER_IMAGE = 'https://via.placeholder.com/400x400?text=No+Image'
+BASE_URL = 'https://www.croma.com'
+
+# "auto" picks the fastest backend that is installed.
+DEFAULT_BACKEND = os.environ.get("CROMA_PARSER", "auto")
+
+# Collects [title, [price texts], image URL, link] per `li.product-item` inside the
+# browser, applying the same IMAGE_ATTRS priority and placeholder filtering
+# as pick_image_url, and returns them with the <head>/<header> markup as one
+# JSON string so only a compact payload crosses the WebDriver wire.
+EXTRACT_PRODUCTS_JS = """
+var attrs = arguments[0], placeholder = arguments[1];
+
+function pickImage(item) {
+    var imgs = item.getElementsByTagName('img');
+    for (var i = 0; i < imgs.length; i++) {
+        for (var j = 0; j < attrs.length; j++) {
+            var url = imgs[i].getAttribute(attrs[j]);
+            if (url && !url.endsWith(placeholder) && (url.indexOf('http') === 0 || url.indexOf('//') === 0)) {
+                return url;
+            }
+        }
+    }
+    return '';
+}
+
+var items = document.querySelectorAll('li.product-item');
+var records = [];
+for (var i = 0; i < items.length; i++) {
+    var title = items[i].querySelector('h3.product-title');
+    var prices = [];
+    items[i].querySelectorAll('span.amount').forEach(function (span) { prices.push(span.textContent); });
+    var link = items[i].querySelector('a[href]');
+    records.push([title ? title.textContent : null, prices, pickImage(items[i]), link ? link.getAttribute('href') : null]);
+}
+
+var header = document.querySelector('header#header');
+return JSON.stringify({
+    products: records,
+    head: document.head ? document.head.outerHTML : null,
+    header: header ? header.outerHTML : null
+});
+"""
+
+
+def pick_image_url(img_attrs):
+    """
+    First usable image URL from a product's <img> attribute dicts.
+
+    Images are tried in document order and, per image, attributes in
+    IMAGE_ATTRS order; lazy-load placeholders and relative URLs are skipped.
+    """
+    for attrs in img_attrs:
+        for attr in IMAGE_ATTRS:
+            image_url = attrs.get(attr)
+            if image_url and not image_url.endswith(LAZY_PLACEHOLDER):
+                if image_url.startswith('http') or image_url.startswith('//'):
+                    return image_url
+    return ''
+
+
+def build_product(title, prices, img_attrs, link=None):
+    """Turn the raw pieces of one `li.product-item` into a product dict."""
+    product = {'title': title.strip() if title is not None else 'N/A'}
+
+    if len(prices) > 1:
+        product['sale_price'] = prices[0].strip()
+        product['price'] = prices[1].strip()
+    elif prices:
+        product['sale_price'] = prices[0].strip()
+        product['price'] = ''
+    else:
+        product['sale_price'] = 'N/A'
+        product['price'] = 'N/A'
+
+    product['image_url'] = pick_image_url(img_attrs) or PLACEHOLDER_IMAGE
+    # The first link in the tile points at the product page.
+    product['url'] = urljoin(BASE_URL, link.strip()) if link else ''
+    return product
+
+
+# --- BeautifulSoup (pure Python, always available) ---------------------------
+
+def _extract_bs4(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    raw = []
+    for item in soup.find_all('li', class_='product-item'):
+        title_element = item.find('h3', class_='product-title')
+        link = item.find('a', href=True)
+        raw.append((
+            title_element.text if title_element else None,
+            [span.text for span in item.find_all('span', class_='amount')],
+            [img.attrs for img in item.find_all('img')],
+            link['href'] if link else None,
+        ))
+    head = soup.find('head')
+    header = soup.find('header', id='header')
+    return raw, {"head": str(head) if head else None, "header": str(header) if header else None}
+
+
+# --- lxml (C parser, precompiled XPath) --------------------------------------
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+if lxml is not None:
+    _LX_PRODUCTS = etree.XPath(f"//li[{_has_class('product-item')}]")
+    _LX_TITLE = etree.XPath(f".//h3[{_has_class('product-title')}]")
+    _LX_PRICES = etree.XPath(f".//span[{_has_class('amount')}]")
+    _LX_IMAGES = etree.XPath(".//img")
+    _LX_LINK = etree.XPath("(.//a[@href])[1]/@href")
+    _LX_HEAD = etree.XPath("//head")
+    _LX_HEADER = etree.XPath("//header[@id='header']")
+
+
+def _lx_text(element):
+    return "".join(element.itertext())
+
+
+def _lx_first_html(xpath, doc):
+    found = xpath(doc)
+    return lxml.html.tostring(found[0], encoding="unicode") if found else None
+
+
+def _extract_lxml(html):
+    doc = lxml.html.document_fromstring(html)
+    raw = []
+    for item in _LX_PRODUCTS(doc):
+        titles = _LX_TITLE(item)
+        links = _LX_LINK(item)
+        raw.append((
+            _lx_text(titles[0]) if titles else None,
+            [_lx_text(span) for span in _LX_PRICES(item)],
+            [dict(img.attrib) for img in _LX_IMAGES(item)],
+            str(links[0]) if links else None,
+        ))
+    return raw, {"head": _lx_first_html(_LX_HEAD, doc), "header": _lx_first_html(_LX_HEADER, doc)}
+
+
+# --- selectolax (Lexbor, fastest) --------------------------------------------
+
+def _extract_selectolax(html):
+    tree = HTMLParser(html)
+    raw = []
+    for item in tree.css('li.product-item'):
+        title_element = item.css_first('h3.product-title')
+        link = item.css_first('a[href]')
+        raw.append((
+            title_element.text(deep=True) if title_element else None,
+            [span.text(deep=True) for span in item.css('span.amount')],
+            [img.attributes for img in item.css('img')],
+            link.attributes.get('href') if link else None,
+        ))
+    head = tree.head
+    header = tree.css_first('header#header')
+    return raw, {"head": head.html if head else None, "header": header.html if header else None}
+
+
+BACKENDS = {"bs4": _extract_bs4}
+if lxml is not None:
+    BACKENDS["lxml"] = _extract_lxml
+if HTMLParser is not None:
+    BACKENDS["selectolax"] = _extract_selectolax
+
+
+def resolve_backend(backend=DEFAULT_BACKEND):
+    if backend == "auto":
+        for name in ("selectolax", "lxml", "bs4"):
+            if name in BACKENDS:
+                return name
+    if backend not in BACKENDS:
+        raise ValueError(f"Parser backend '{backend}' is not available (installed: {', '.join(BACKENDS)})")
+    return backend
+
+
+def _build_products(raw):
+    products = []
+    fallbacks = 0
+    for i, (title, prices, img_attrs, link) in enumerate(raw):
+        product = build_product(title, prices, img_attrs, link)
+        if product['image_url'] == PLACEHOLDER_IMAGE:
+            fallbacks += 1
+            logging.warning(f"No valid image found for product {i+1}: {product['title']}")
+        products.append(product)
+    if fallbacks:
+        metrics.inc("scraper_image_fallbacks_total", fallbacks, job="croma")
+    return products
+
+
+def extract_in_browser(driver):
+    """
+    Extract products and page elements with one `execute_script` call.
+
+    Produces the same products as `extract_page(driver.page_source)` without
+    serializing the whole DOM and re-parsing it in Python.
+    """
+    payload = json.loads(driver.execute_script(EXTRACT_PRODUCTS_JS, list(IMAGE_ATTRS), LAZY_PLACEHOLDER))
+    raw = [
+        (title, prices, [{'src': image_url}] if image_url else [], link)
+        for title, prices, image_url, link in payload["products"]
+    ]
+    return _build_products(raw), {"head": payload["head"], "header": payload["header"]}
+
+
+def extract_page(html, backend=DEFAULT_BACKEND):
+    """
+    Extract products and the <head>/<header> elements from a Croma listing page.
+
+    Returns `(products, page_elements)`. Every backend walks each product
+    once and yields identical product dicts; `page_elements` is serialized
+    by the backend, so its whitespace and attribute quoting may differ.
+    """
+    extract = BACKENDS[resolve_backend(backend)]
+    raw, page_elements = extract(html)
+    return _build_products(raw), page_elements
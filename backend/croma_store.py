@@ -0,0 +1,571 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from decimal import Decimal, InvalidOperation
+
+import codec
+from events import add_events
+from search_index import SearchIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+PRODUCTS_KEY = "croma_catalog"                  # hash: product id -> product JSON
+PRODUCTS_ORDER_KEY = "croma_catalog:order"      # zset: product id -> listing sequence
+PRODUCTS_SEEN_KEY = "croma_catalog:last_seen"   # zset: product id -> last scrape timestamp
+# Staleness is tracked per scrape source (a listing URL, a crawled category):
+# a product is current while the latest run of any source saw it.
+PRODUCTS_SOURCES_KEY = "croma_catalog:sources"  # hash: source -> time of its latest run
+SOURCE_SEEN_PREFIX = "croma_catalog:source:"    # set per source: products its latest run saw
+PRODUCTS_CURRENT_KEY = "croma_catalog:current"  # zset: current product id -> listing sequence
+DEFAULT_SOURCE = "listing"
+LEGACY_SOURCE = "legacy"                        # seeded from last_seen for catalogs without sources
+PRODUCTS_SEQ_KEY = "croma_catalog:seq"
+PRODUCTS_VERSION_KEY = "croma_catalog:version"  # bumped whenever the catalog changes
+LEGACY_PRODUCTS_KEY = "croma_products"          # full JSON list written by older scrapers
+
+# Sorted indexes maintained by ingest_products so /products can filter and
+# page without loading the catalog. Only current products are indexed, and
+# products without a price are not.
+PRICE_INDEX_KEY = "croma_idx:sale_price"        # zset: product id -> sale price (paise)
+INDEX_VERSION_KEY = "croma_idx:version"
+INDEX_VERSION = "3"
+
+# sort name -> (zset holding the order, descending)
+SORTS = {
+    "listing": (PRODUCTS_CURRENT_KEY, False),
+    "price": (PRICE_INDEX_KEY, False),
+    "-price": (PRICE_INDEX_KEY, True),
+}
+
+# One zset per product: member "<ts>:<sale paise>:<mrp paise>", score ts.
+# A point is appended only when the price changes.
+PRICE_HISTORY_PREFIX = "croma_price:"
+PRICE_DROPS_KEY = "croma_price_drops"           # zset: product id -> time of its last drop
+HISTORY_MAX_POINTS = int(os.environ.get("CROMA_HISTORY_MAX_POINTS", "1000"))
+STALE_DAYS = float(os.environ.get("CROMA_STALE_DAYS", "30"))
+
+# Fields that come from the page; bookkeeping fields are not diffed.
+TRACKED_FIELDS = ("title", "url", "image_url", "sale_price", "price", "category", "categories")
+
+_SKU_RE = re.compile(r"/p/(\w+)")
+_PRICE_RE = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def product_id(product):
+    """
+    Stable product id: the SKU from the product URL when there is one, else a
+    hash of the URL, else a hash of title and image for tiles without links.
+    """
+    url = product.get("url") or ""
+    match = _SKU_RE.search(url)
+    if match:
+        return match.group(1)
+    basis = url or f"{product.get('title', '').strip().lower()}\0{product.get('image_url', '')}"
+    return hashlib.sha1(basis.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_price(text):
+    """`"₹49,990"` -> `4999000` (paise); None when the text holds no price."""
+    match = _PRICE_RE.search(text or "")
+    if not match:
+        return None
+    try:
+        return int(Decimal(match.group(0).replace(",", "")) * 100)
+    except InvalidOperation:
+        return None
+
+
+def price_history_key(pid):
+    return PRICE_HISTORY_PREFIX + pid
+
+
+def _encode(product):
+    return json.dumps(product, sort_keys=True)
+
+
+def _point(ts, sale, mrp):
+    return f"{ts}:{'' if sale is None else sale}:{'' if mrp is None else mrp}"
+
+
+def _parse_point(member):
+    ts, sale, mrp = member.split(":")
+    return {
+        "at": int(ts),
+        "sale_price": int(sale) if sale else None,
+        "mrp": int(mrp) if mrp else None,
+    }
+
+
+def _changed_fields(old, new):
+    return [field for field in TRACKED_FIELDS if old.get(field) != new.get(field)]
+
+
+def _delta(record, changed):
+    """Event payload: the whole record for a new product, else only what changed."""
+    if changed is None:
+        return dict(record, new=True)
+    delta = {"id": record["id"], "updated_at": record["updated_at"]}
+    for field in changed:
+        delta[field] = record.get(field)
+    if "sale_price" in changed or "price" in changed:
+        delta.update(sale_price_paise=record["sale_price_paise"], mrp_paise=record["mrp_paise"])
+        if "last_drop" in record:
+            delta["last_drop"] = record["last_drop"]
+    return delta
+
+
+def _index_price(pipe, pid, sale):
+    if sale is None:
+        pipe.zrem(PRICE_INDEX_KEY, pid)
+    else:
+        pipe.zadd(PRICE_INDEX_KEY, {pid: sale})
+
+
+def source_key(source):
+    return SOURCE_SEEN_PREFIX + source
+
+
+def rebuild_indexes(r):
+    """
+    Recreate the current-products order and the price index from the
+    stored catalog. A catalog stored before sources were tracked gets one
+    `legacy` source holding the products its newest scrape saw.
+    """
+    if not r.exists(PRODUCTS_SOURCES_KEY):
+        seen = r.zrange(PRODUCTS_SEEN_KEY, 0, -1, withscores=True)
+        latest = max((ts for _, ts in seen), default=0)
+        newest = [pid for pid, ts in seen if ts >= latest]
+        if newest:
+            r.sadd(source_key(LEGACY_SOURCE), *newest)
+            r.hset(PRODUCTS_SOURCES_KEY, LEGACY_SOURCE, int(latest))
+    current = _current_ids(r, r.hkeys(PRODUCTS_SOURCES_KEY))
+    order = dict(r.zrange(PRODUCTS_ORDER_KEY, 0, -1, withscores=True))
+
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(PRICE_INDEX_KEY, PRODUCTS_CURRENT_KEY)
+    count = 0
+    for pid, raw in r.hscan_iter(PRODUCTS_KEY):
+        if pid not in current or pid not in order:
+            continue
+        pipe.zadd(PRODUCTS_CURRENT_KEY, {pid: order[pid]})
+        sale = json.loads(raw).get("sale_price_paise")
+        if sale is not None:
+            pipe.zadd(PRICE_INDEX_KEY, {pid: sale})
+            count += 1
+    pipe.set(INDEX_VERSION_KEY, INDEX_VERSION)
+    pipe.execute()
+    logging.info(f"Rebuilt Croma indexes: {len(current)} current products, {count} priced")
+
+
+def ensure_indexes(r):
+    if r.get(INDEX_VERSION_KEY) != INDEX_VERSION:
+        rebuild_indexes(r)
+
+
+def _current_ids(r, sources):
+    """Union of what the latest run of each of `sources` saw."""
+    if not sources:
+        return set()
+    pipe = r.pipeline(transaction=False)
+    for source in sources:
+        pipe.smembers(source_key(source))
+    return set().union(*pipe.execute())
+
+
+def ingest_products(r, products, now=None, stale_days=STALE_DAYS, sources=None):
+    """
+    Merge one scrape into the catalog, writing only what changed.
+
+    Each product is diffed against its stored record; unchanged products
+    cost nothing but a last-seen timestamp. A price change appends one
+    point to the product's price history, and a lower sale price records a
+    drop. Products not seen for `stale_days` are removed together with their
+    history. All writes go through one MULTI/EXEC pipeline.
+
+    `sources` maps each scrape source this run covered to the ids of the
+    products it saw (None: every product of the run); by default the run
+    is the `listing` source. A source's previous products that it no longer
+    lists stop being current unless another source still lists them.
+    Returns a dict with `added`, `updated`, `unchanged`, `price_changes`,
+    `price_drops` and `removed` counts.
+    """
+    now = int(time.time() if now is None else now)
+
+    ensure_indexes(r)
+
+    incoming = {}
+    for product in products:
+        record = {field: product[field] for field in TRACKED_FIELDS if field in product}
+        record["id"] = product_id(product)
+        record["sale_price_paise"] = parse_price(product.get("sale_price"))
+        record["mrp_paise"] = parse_price(product.get("price")) or record["sale_price_paise"]
+        incoming.setdefault(record["id"], record)
+
+    ids = list(incoming)
+    existing = r.hmget(PRODUCTS_KEY, ids) if ids else []
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "price_changes": 0, "price_drops": 0, "removed": 0}
+
+    new_ids = [pid for pid, stored in zip(ids, existing) if stored is None]
+    seq = r.incrby(PRODUCTS_SEQ_KEY, len(new_ids)) - len(new_ids) if new_ids else 0
+
+    stale = r.zrangebyscore(PRODUCTS_SEEN_KEY, "-inf", f"({now - stale_days * 86400}")
+    stale = [pid for pid in stale if pid not in incoming]
+    known_sources = r.hkeys(PRODUCTS_SOURCES_KEY)
+
+    # Replace what each source of this run saw; the current products (the
+    # only ones indexed) are the union over all sources.
+    runs = {source: set(seen_ids) if seen_ids is not None else set(incoming)
+            for source, seen_ids in (sources or {DEFAULT_SOURCE: None}).items()}
+    current = set().union(*runs.values())
+    current |= _current_ids(r, [source for source in known_sources if source not in runs])
+    current -= set(stale)
+    was_current = set(r.zrange(PRODUCTS_CURRENT_KEY, 0, -1))
+
+    events = []
+    new_positions = {}
+    priced = set()  # products whose index entry this run already wrote
+    pipe = r.pipeline(transaction=True)
+    for pid, stored in zip(ids, existing):
+        record = incoming[pid]
+        old = json.loads(stored) if stored else None
+        changed = None
+
+        if old is None:
+            stats["added"] += 1
+            record["first_seen"] = now
+            record["updated_at"] = now
+            pipe.zadd(PRODUCTS_ORDER_KEY, {pid: seq})
+            new_positions[pid] = seq
+            seq += 1
+        else:
+            for field in ("first_seen", "last_drop"):
+                if field in old:
+                    record[field] = old[field]
+            # A scrape only diffs the fields it supplies: scraper.refresh reads
+            # one listing without categories and must not clear the crawler's.
+            for field in TRACKED_FIELDS:
+                if field not in record and field in old:
+                    record[field] = old[field]
+            changed = _changed_fields(old, record)
+            if not changed:
+                stats["unchanged"] += 1
+                continue
+            stats["updated"] += 1
+            record["updated_at"] = now
+            logging.debug(f"Product {pid} changed: {', '.join(changed)}")
+
+        old_sale = old.get("sale_price_paise") if old else None
+        old_mrp = old.get("mrp_paise") if old else None
+        sale, mrp = record["sale_price_paise"], record["mrp_paise"]
+        if old is None or (sale, mrp) != (old_sale, old_mrp):
+            if old is not None:
+                stats["price_changes"] += 1
+            if pid in current:
+                _index_price(pipe, pid, sale)
+                priced.add(pid)
+            history_key = price_history_key(pid)
+            pipe.zadd(history_key, {_point(now, sale, mrp): now})
+            pipe.zremrangebyrank(history_key, 0, -HISTORY_MAX_POINTS - 1)
+            if old_sale is not None and sale is not None and sale < old_sale:
+                stats["price_drops"] += 1
+                record["last_drop"] = {"from": old_sale, "to": sale, "at": now}
+                pipe.zadd(PRICE_DROPS_KEY, {pid: now})
+
+        pipe.hset(PRODUCTS_KEY, pid, _encode(record))
+        events.append(("product", _delta(record, changed)))
+
+    if ids:
+        pipe.zadd(PRODUCTS_SEEN_KEY, {pid: now for pid in ids})
+
+    if stale:
+        stats["removed"] = len(stale)
+        pipe.hdel(PRODUCTS_KEY, *stale)
+        pipe.zrem(PRODUCTS_ORDER_KEY, *stale)
+        pipe.zrem(PRODUCTS_SEEN_KEY, *stale)
+        pipe.zrem(PRODUCTS_CURRENT_KEY, *stale)
+        pipe.zrem(PRICE_DROPS_KEY, *stale)
+        pipe.zrem(PRICE_INDEX_KEY, *stale)
+        for source in known_sources:
+            pipe.srem(source_key(source), *stale)
+        pipe.delete(*[price_history_key(pid) for pid in stale])
+        events.append(("removed", {"ids": stale}))
+
+    for source, seen_ids in runs.items():
+        pipe.delete(source_key(source))
+        if seen_ids:
+            pipe.sadd(source_key(source), *seen_ids)
+        pipe.hset(PRODUCTS_SOURCES_KEY, source, now)
+    dropped = was_current - current - set(stale)
+    joined = sorted(current - was_current)
+    if dropped:
+        pipe.zrem(PRODUCTS_CURRENT_KEY, *dropped)
+        pipe.zrem(PRICE_INDEX_KEY, *dropped)
+    if joined:
+        positions = dict(zip(joined, r.zmscore(PRODUCTS_ORDER_KEY, joined)))
+        positions.update(new_positions)
+        pipe.zadd(PRODUCTS_CURRENT_KEY, {pid: positions[pid] for pid in joined if positions.get(pid) is not None})
+        # Products rejoining without a price change still need their index entry.
+        unpriced = [pid for pid in joined if pid not in priced]
+        for pid, raw in zip(unpriced, r.hmget(PRODUCTS_KEY, unpriced) if unpriced else []):
+            record = incoming.get(pid) or (json.loads(raw) if raw else None)
+            if record is not None:
+                _index_price(pipe, pid, record.get("sale_price_paise"))
+
+    if stats["added"] or stats["updated"] or stats["removed"] or dropped or joined:
+        pipe.incr(PRODUCTS_VERSION_KEY)
+    # New and changed products are pushed to /products/stream subscribers.
+    add_events(pipe, "croma", events)
+    # The catalog supersedes the old full-list blob.
+    pipe.delete(LEGACY_PRODUCTS_KEY)
+    pipe.execute()
+    return stats
+
+
+def load_products(r, include_stale=False):
+    """
+    Catalog products in listing order, or None when nothing is stored.
+
+    Each product carries its `last_seen` time and `stale`: whether no
+    source's latest scrape listed it. Stale products are left out unless
+    `include_stale`; they stay in the catalog until `STALE_DAYS` pass.
+    """
+    if not r.exists(PRODUCTS_ORDER_KEY):
+        return codec.load(r, LEGACY_PRODUCTS_KEY)
+    ensure_indexes(r)
+    pipe = r.pipeline(transaction=False)
+    pipe.zrange(PRODUCTS_ORDER_KEY if include_stale else PRODUCTS_CURRENT_KEY, 0, -1)
+    pipe.zrange(PRODUCTS_CURRENT_KEY, 0, -1)
+    ids, current = pipe.execute()
+    if not ids:
+        return []
+    current = set(current)
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(PRODUCTS_KEY, ids)
+    pipe.zmscore(PRODUCTS_SEEN_KEY, ids)
+    raws, seen = pipe.execute()
+    return [
+        dict(codec.loads(raw), last_seen=None if ts is None else int(ts), stale=pid not in current)
+        for pid, raw, ts in zip(ids, raws, seen) if raw
+    ]
+
+
+def get_product(r, pid):
+    raw = r.hget(PRODUCTS_KEY, pid)
+    return json.loads(raw) if raw else None
+
+
+def price_history(r, pid, since=None, limit=None):
+    """Price points of one product, oldest first; `limit` keeps the newest ones."""
+    points = r.zrangebyscore(price_history_key(pid), since if since is not None else "-inf", "+inf")
+    if limit is not None:
+        points = points[-limit:] if limit else []
+    return [_parse_point(member) for member in points]
+
+
+def recent_price_drops(r, since=None, limit=50):
+    """Products whose sale price dropped most recently, newest drop first."""
+    pids = r.zrevrangebyscore(PRICE_DROPS_KEY, "+inf", since if since is not None else "-inf", start=0, num=limit)
+    drops = []
+    for raw in (r.hmget(PRODUCTS_KEY, pids) if pids else []):
+        if not raw:
+            continue
+        product = json.loads(raw)
+        drop = product.get("last_drop")
+        if not drop:
+            continue
+        drops.append({
+            "id": product["id"],
+            "title": product.get("title"),
+            "url": product.get("url"),
+            "image_url": product.get("image_url"),
+            "from": drop["from"],
+            "to": drop["to"],
+            "at": drop["at"],
+            "percent": round((drop["from"] - drop["to"]) * 100 / drop["from"], 1) if drop["from"] else None,
+        })
+    return drops
+
+
+# --- /products queries --------------------------------------------------------
+
+class QueryError(ValueError):
+    """A /products query the store cannot answer (bad cursor, sort or field)."""
+
+
+def encode_cursor(score, pid):
+    return base64.urlsafe_b64encode(json.dumps([score, pid]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        score, pid = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), str(pid)
+    except (ValueError, TypeError):
+        raise QueryError("Invalid cursor")
+
+
+class CatalogIndex:
+    """
+    In-process view of the catalog for queries the Redis indexes cannot
+    answer alone: title search, or a price range in listing order.
+
+    Holds only ids, listing positions, prices, the title postings and
+    which products are current (None: all of them).
+    """
+
+    def __init__(self, products, order, current=None):
+        self.order = order
+        self.current = current
+        self.prices = {p["id"]: p["sale_price_paise"] for p in products if p.get("sale_price_paise") is not None}
+        self.titles = SearchIndex({"id": p["id"], "title": p.get("title", "")} for p in products)
+
+    def query(self, search="", min_price=None, max_price=None, sort="listing", include_stale=False):
+        """Matching `(score, id)` pairs in ascending (score, id) order."""
+        if search:
+            ids, _ = self.titles.search(search)
+        else:
+            ids = self.order
+        if not include_stale and self.current is not None:
+            ids = [pid for pid in ids if pid in self.current]
+        if min_price is not None or max_price is not None or sort != "listing":
+            lo = float("-inf") if min_price is None else min_price
+            hi = float("inf") if max_price is None else max_price
+            ids = [pid for pid in ids if pid in self.prices and lo <= self.prices[pid] <= hi]
+        scores = self.prices if sort != "listing" else self.order
+        return sorted((scores[pid], pid) for pid in ids if pid in scores)
+
+
+_catalog_lock = threading.Lock()
+_catalog_state = {"version": None, "index": None}
+
+
+def get_catalog_index(r):
+    """Return the in-process `CatalogIndex`, rebuilding it if the catalog changed."""
+    version = r.get(PRODUCTS_VERSION_KEY) or "0"
+    with _catalog_lock:
+        if _catalog_state["index"] is None or _catalog_state["version"] != version:
+            order = {pid: score for pid, score in r.zrange(PRODUCTS_ORDER_KEY, 0, -1, withscores=True)}
+            current = set(r.zrange(PRODUCTS_CURRENT_KEY, 0, -1))
+            products = [codec.loads(raw) for raw in r.hvals(PRODUCTS_KEY)]
+            _catalog_state["index"] = CatalogIndex(products, order, current)
+            _catalog_state["version"] = version
+            logging.info(f"Rebuilt catalog index over {len(products)} products (version {version})")
+        return _catalog_state["index"]
+
+
+def _page_in_memory(pairs, descending, cursor, limit):
+    """One page of ascending `(score, id)` pairs after the keyset `cursor`."""
+    if descending:
+        end = len(pairs) if cursor is None else bisect_left(pairs, cursor)
+        return pairs[max(0, end - limit):end][::-1], end > limit
+    start = 0 if cursor is None else bisect_right(pairs, cursor)
+    return pairs[start:start + limit], start + limit < len(pairs)
+
+
+def _page_from_redis(r, key, descending, min_price, max_price, cursor, limit):
+    """
+    One page straight from a sorted index: a few ZCOUNT/ZRANK lookups locate
+    the page, then only `limit` members are read.
+    """
+    lo = "-inf" if min_price is None else min_price
+    hi = "+inf" if max_price is None else max_price
+    pipe = r.pipeline(transaction=False)
+    pipe.zcount(key, lo, hi)
+    if descending:
+        pipe.zcount(key, f"({hi}", "+inf")      # first rank in range
+        pipe.zcount(key, lo, "+inf")            # one past the last rank
+    else:
+        pipe.zcount(key, "-inf", f"({lo}")
+        pipe.zcount(key, "-inf", hi)
+    if cursor is not None:
+        score, pid = cursor
+        pipe.zscore(key, pid)
+        pipe.zrevrank(key, pid) if descending else pipe.zrank(key, pid)
+        pipe.zcount(key, f"({score}", "+inf") if descending else pipe.zcount(key, "-inf", f"({score}")
+    total, first, stop, *after = pipe.execute()
+
+    start = first
+    if cursor is not None:
+        stored_score, rank, before_score = after
+        if rank is not None and stored_score == cursor[0]:
+            start = max(first, rank + 1)
+        else:
+            # The cursor's product changed or vanished: resume at its score.
+            start = max(first, before_score)
+
+    end = min(start + limit, stop)
+    if end <= start:
+        return [], total, False
+    page = (r.zrevrange if descending else r.zrange)(key, start, end - 1, withscores=True)
+    return [(score, pid) for pid, score in page], total, end < stop
+
+
+def _project(product, fields):
+    if fields is None:
+        return product
+    return {field: product.get(field) for field in fields}
+
+
+def query_products(r, search="", min_price=None, max_price=None, sort="listing", cursor=None, limit=50, fields=None,
+                   include_stale=False):
+    """
+    Return `(products, total, next_cursor)` for one page of the catalog.
+
+    Prices are in paise. Without a title search, price-sorted pages and
+    unfiltered listing pages come straight from the Redis sorted indexes, so
+    the work is proportional to `limit`. Searches, and price ranges in
+    listing order, go through the in-process `CatalogIndex`. Like
+    `load_products`, only current products match unless `include_stale`
+    (which also goes through the `CatalogIndex`), and each product carries
+    `last_seen` and `stale`. `cursor` is the opaque `next_cursor` of the
+    previous page; `fields` projects each product onto the given keys.
+    Returns `(None, 0, None)` when nothing has been scraped yet.
+    """
+    if sort not in SORTS:
+        raise QueryError(f"Unknown sort '{sort}' (use one of: {', '.join(SORTS)})")
+    key, descending = SORTS[sort]
+    cursor = decode_cursor(cursor) if cursor else None
+    if fields is not None and "id" not in fields:
+        fields = ["id"] + list(fields)
+
+    if not r.exists(PRODUCTS_ORDER_KEY):
+        legacy = codec.load(r, LEGACY_PRODUCTS_KEY)
+        if not legacy:
+            return None, 0, None
+        records = {}
+        for position, product in enumerate(legacy):
+            product = dict(product, id=product_id(product), sale_price_paise=parse_price(product.get("sale_price")))
+            records.setdefault(product["id"], dict(product, position=position))
+        index = CatalogIndex(list(records.values()), {pid: p["position"] for pid, p in records.items()})
+        pairs = index.query(search, min_price, max_price, sort)
+        page, more = _page_in_memory(pairs, descending, cursor, limit)
+        products = [_project(records[pid], fields) for _, pid in page]
+        return products, len(pairs), encode_cursor(*page[-1]) if more else None
+
+    ensure_indexes(r)
+    if include_stale or search or (sort == "listing" and (min_price is not None or max_price is not None)):
+        pairs = get_catalog_index(r).query(search, min_price, max_price, sort, include_stale)
+        page, more = _page_in_memory(pairs, descending, cursor, limit)
+        total = len(pairs)
+    else:
+        page, total, more = _page_from_redis(r, key, descending, min_price, max_price, cursor, limit)
+
+    ids = [pid for _, pid in page]
+    if not ids:
+        return [], total, None
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(PRODUCTS_KEY, ids)
+    pipe.zmscore(PRODUCTS_SEEN_KEY, ids)
+    pipe.zmscore(PRODUCTS_CURRENT_KEY, ids)
+    raws, seen, current = pipe.execute()
+    products = [
+        _project(dict(codec.loads(raw), last_seen=None if ts is None else int(ts), stale=position is None), fields)
+        for raw, ts, position in zip(raws, seen, current) if raw
+    ]
+    return products, total, encode_cursor(*page[-1]) if more else None
@@ -0,0 +1,138 @@
+import hashlib
+import html
+import random
+import re
+from collections import defaultdict, namedtuple
+
+WORD_RE = re.compile(r"[A-Za-z0-9]+")
+
+# MinHash over the words of the cleaned title and summary, banded for LSH:
+# two articles become candidates when all ROWS values of any one of BANDS
+# bands agree, which happens with probability 1 - (1 - J**ROWS)**BANDS for
+# word-set Jaccard similarity J (~0.96 at J=0.7, ~0.02 at J=0.2). Lookups
+# only touch articles sharing a bucket, so they stay sublinear in the corpus.
+BANDS = 12
+ROWS = 4
+NUM_HASHES = BANDS * ROWS
+# Candidates are confirmed on the exact word sets. Templated headlines
+# ("Sanofi names new chief executive" / "Takeda names new chief executive")
+# share most words, so they must also share most of their named entities:
+# capitalized words and numbers in the title.
+MIN_SIMILARITY = 0.7
+MIN_ENTITY_OVERLAP = 0.75
+ENTITY_STOPWORDS = {"a", "an", "the", "and", "or", "of", "in", "on", "for", "to", "with", "as", "at", "by", "after", "new"}
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # fixed, so buckets are stable across processes and restarts
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+Fingerprint = namedtuple("Fingerprint", ["words", "entities"])
+
+
+def _clean(text, source):
+    text = html.unescape(text or "").replace("\xa0", " ").strip()
+    if source:
+        for separator in (" - ", " | ", " "):
+            if text.endswith(separator + source):
+                return text[:-len(separator + source)].strip()
+    return text
+
+
+def _word(word):
+    word = word.lower()
+    return word[:-1] if word.endswith("s") and len(word) > 3 and not word.endswith("ss") else word
+
+
+def fingerprint(article):
+    """
+    Word and entity sets of an article's title and summary.
+
+    The outlet name and HTML entities are removed first, so copies of one
+    story from different outlets (or returned for different company
+    queries) fingerprint identically. Plural and possessive "s" is dropped.
+    """
+    source = article.get("source", "")
+    title = WORD_RE.findall(_clean(article.get("title", ""), source))
+    summary = WORD_RE.findall(_clean(article.get("summary", ""), source))
+    entities = frozenset(
+        _word(word) for word in title
+        if (word[0].isupper() or word[0].isdigit()) and word.lower() not in ENTITY_STOPWORDS
+    )
+    return Fingerprint(frozenset(_word(word) for word in title + summary if word != "s"), entities)
+
+
+def encode(fp):
+    return {"w": sorted(fp.words), "e": sorted(fp.entities)}
+
+
+def decode(data):
+    return Fingerprint(frozenset(data.get("w", ())), frozenset(data.get("e", ())))
+
+
+def _minhash(words):
+    hashes = [int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "big") for word in words]
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def lsh_buckets(fp):
+    """The `"<band>:<hex>"` LSH buckets an article falls into (empty for an empty text)."""
+    signature = _minhash(fp.words)
+    if signature is None:
+        return []
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(",".join(map(str, rows)).encode("ascii"), digest_size=6).hexdigest()
+        buckets.append(f"{band}:{digest}")
+    return buckets
+
+
+def _jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def similarity(a, b):
+    """Word-set Jaccard similarity of two fingerprints."""
+    return _jaccard(a.words, b.words)
+
+
+def is_near_duplicate(a, b):
+    return similarity(a, b) >= MIN_SIMILARITY and _jaccard(a.entities, b.entities) >= MIN_ENTITY_OVERLAP
+
+
+def closest(fp, candidates):
+    """Key of the most similar near-duplicate among `(key, fingerprint)` pairs, or None."""
+    best_key, best = None, 0.0
+    for key, other in candidates:
+        if is_near_duplicate(fp, other):
+            score = similarity(fp, other)
+            if score > best:
+                best_key, best = key, score
+    return best_key
+
+
+class NearDuplicateIndex:
+    """In-memory LSH index of fingerprints; `find` returns a near-duplicate's key."""
+
+    def __init__(self):
+        self.buckets = defaultdict(set)
+        self.fingerprints = {}
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    # `buckets` can be passed in when the caller already has `lsh_buckets(fp)`.
+    def add(self, key, fp, buckets=None):
+        self.fingerprints[key] = fp
+        for bucket in lsh_buckets(fp) if buckets is None else buckets:
+            self.buckets[bucket].add(key)
+
+    def find(self, fp, buckets=None):
+        keys = set()
+        for bucket in lsh_buckets(fp) if buckets is None else buckets:
+            keys |= self.buckets.get(bucket, set())
+        return closest(fp, ((key, self.fingerprints[key]) for key in keys))
@@ -0,0 +1,229 @@
+import atexit
+import functools
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36"
+
+STEALTH_JS = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined})"
+
+# The scraper reads image URLs from attributes, never the image bytes, so
+# images, media, fonts and trackers are blocked at the network layer. The
+# lazy loader still swaps data-src into src; the request is just never sent.
+# Chrome matches each pattern against the whole URL, so every extension is
+# listed bare and with a query string (Croma's ImageKit URLs end "?tr=w-…").
+BLOCK_RESOURCES = os.environ.get("CROMA_BLOCK_RESOURCES", "1") != "0"
+BLOCKED_EXTENSIONS = [
+    "png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico",
+    "mp4", "webm", "m3u8", "mp3",
+    "woff", "woff2", "ttf", "otf", "eot",
+]
+BLOCKED_URL_PATTERNS = [pattern for ext in BLOCKED_EXTENSIONS for pattern in (f"*.{ext}", f"*.{ext}?*")] + [
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*connect.facebook.com*", "*hotjar.com*", "*clarity.ms*",
+    "*criteo.*", "*adobedtm.com*", "*omtrdc.net*", "*demdex.net*",
+    "*newrelic.com*", "*nr-data.net*", "*moengage.com*", "*branch.io*",
+]
+
+
+def chrome_options():
+    """Headless Chrome options with the stealth tweaks the Croma scraper needs."""
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument(f"user-agent={USER_AGENT}")
+    return options
+
+
+@functools.lru_cache(maxsize=1)
+def chromedriver_path():
+    """
+    Resolve the chromedriver binary once per process.
+
+    CHROMEDRIVER_PATH skips webdriver-manager's version lookup entirely.
+    """
+    path = os.environ.get("CHROMEDRIVER_PATH") or ChromeDriverManager().install()
+    logging.info(f"Using chromedriver at {path}")
+    return path
+
+
+def new_driver(block_resources=None):
+    """Start a Chrome session; `block_resources` defaults to CROMA_BLOCK_RESOURCES."""
+    block_resources = BLOCK_RESOURCES if block_resources is None else block_resources
+    with metrics.span("croma", "driver_start"):
+        driver = webdriver.Chrome(service=Service(chromedriver_path()), options=chrome_options())
+    # Applied to every document the session loads, not just the current one.
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": STEALTH_JS})
+    if block_resources:
+        # Blocking lasts for the whole session, across navigations.
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+
+class PooledDriver:
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class WebDriverPool:
+    """
+    Pool of warm headless Chrome sessions.
+
+    `session()` hands out one driver at a time per caller. Between uses the
+    session is reset (cookies, storage, blank page); it is replaced after
+    `max_uses` scrapes, or as soon as a scrape raises or the browser stops
+    responding.
+    """
+
+    def __init__(self, size=2, max_uses=25, factory=new_driver):
+        self.size = size
+        self.max_uses = max_uses
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def prewarm(self, count=None):
+        """Start up to `count` (default: pool size) sessions ahead of time."""
+        count = self.size if count is None else min(count, self.size)
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    return
+                self._created += 1
+            try:
+                self._idle.put(PooledDriver(self.factory()))
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self, timeout):
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+                if can_create:
+                    try:
+                        logging.info("Starting a new browser session for the pool...")
+                        return PooledDriver(self.factory())
+                    except Exception:
+                        with self._lock:
+                            self._created -= 1
+                        raise
+                pooled = self._idle.get(timeout=timeout)
+
+            if self._alive(pooled):
+                return pooled
+            self._discard(pooled)
+
+    @staticmethod
+    def _alive(pooled):
+        try:
+            pooled.driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, pooled):
+        with self._lock:
+            self._created -= 1
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    def _reset(self, pooled):
+        driver = pooled.driver
+        driver.delete_all_cookies()
+        driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        driver.get("about:blank")
+
+    @contextmanager
+    def session(self, timeout=300):
+        pooled = self._acquire(timeout)
+        pooled.uses += 1
+        try:
+            yield pooled.driver
+        except Exception:
+            logging.warning("Discarding browser session after a failed scrape.")
+            self._discard(pooled)
+            raise
+
+        if self._closed or pooled.uses >= self.max_uses:
+            self._discard(pooled)
+            return
+        try:
+            self._reset(pooled)
+        except Exception as e:
+            logging.warning(f"Browser session reset failed, recycling it: {e}")
+            self._discard(pooled)
+            return
+        self._idle.put(pooled)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_default_pool():
+    """Process-wide pool sized by CROMA_DRIVER_POOL_SIZE (default 1)."""
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = WebDriverPool(size=int(os.environ.get("CROMA_DRIVER_POOL_SIZE", "1")))
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+def prewarm_default_pool():
+    """
+    Start the default pool's sessions on a background thread, so the first
+    scrape after startup does not pay for launching Chrome. Set
+    CROMA_PREWARM=0 to skip it.
+    """
+    if os.environ.get("CROMA_PREWARM", "1") == "0":
+        return None
+
+    def warm():
+        try:
+            get_default_pool().prewarm()
+            logging.info("Browser pool prewarmed.")
+        except Exception as e:
+            logging.warning(f"Could not prewarm the browser pool: {e}")
+
+    thread = threading.Thread(target=warm, name="croma-prewarm", daemon=True)
+    thread.start()
+    return thread
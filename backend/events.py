@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from flask import Response, request, stream_with_context
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Each namespace ("croma", "pharma") has a Redis stream holding its recent
+# change events and a pub/sub channel the scrapers publish to after
+# writing. The stream is the source of truth and gives every event an id
+# clients resume from; the channel only wakes the API processes up.
+STREAM_PREFIX = "events:"
+CHANNEL_PREFIX = "events:"
+STREAM_MAXLEN = 10000      # approximate; older events can no longer be resumed from
+BUFFER_SIZE = 1000         # events each API process keeps in memory for its clients
+REPLAY_LIMIT = 1000        # events replayed to a client resuming from an old id
+HEARTBEAT_SECONDS = 15
+
+
+def stream_key(namespace):
+    return STREAM_PREFIX + namespace
+
+
+def add_events(pipe, namespace, events):
+    """
+    Queue `(type, data)` events on a pipeline, so they commit together with
+    the writes they describe, and notify subscribers when it executes.
+    """
+    if not events:
+        return
+    for event_type, data in events:
+        pipe.xadd(
+            stream_key(namespace),
+            {"type": event_type, "data": json.dumps(data, separators=(",", ":"))},
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+    pipe.publish(CHANNEL_PREFIX + namespace, len(events))
+
+
+def _parse_id(event_id):
+    try:
+        ms, seq = event_id.split("-")
+        return int(ms), int(seq)
+    except (AttributeError, ValueError):
+        return None
+
+
+class EventHub:
+    """
+    Fans one namespace's events out to any number of SSE clients.
+
+    A single pub/sub listener per process reads new stream entries into an
+    in-memory ring buffer and wakes the waiting clients, so Redis work does
+    not grow with the number of subscribers. Clients resuming from an id
+    older than the buffer are replayed from the stream.
+    """
+
+    def __init__(self, redis_client, namespace, buffer_size=BUFFER_SIZE, heartbeat=HEARTBEAT_SECONDS):
+        self.r = redis_client
+        self.namespace = namespace
+        self.key = stream_key(namespace)
+        self.heartbeat = heartbeat
+        self._buffer = deque(maxlen=buffer_size)  # (parsed id, id, type, data)
+        self._cond = threading.Condition()
+        self._latest = None
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.clients = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            latest = self.r.xrevrange(self.key, count=1)
+            self._latest = latest[0][0] if latest else "0-0"
+            self._started = True
+            threading.Thread(target=self._listen, name=f"events-{self.namespace}", daemon=True).start()
+
+    @property
+    def latest(self):
+        return self._latest
+
+    def _pull(self):
+        """Move stream entries newer than the last one seen into the buffer."""
+        entries = self.r.xrange(self.key, min=f"({self._latest}", max="+")
+        if not entries:
+            return
+        with self._cond:
+            for event_id, fields in entries:
+                self._buffer.append((_parse_id(event_id), event_id, fields.get("type", "message"), fields.get("data", "")))
+            self._latest = entries[-1][0]
+            self._cond.notify_all()
+
+    def _listen(self):
+        channel = CHANNEL_PREFIX + self.namespace
+        while True:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                self._pull()
+                while True:
+                    # The timeout doubles as a poll, covering missed notifications.
+                    message = pubsub.get_message(timeout=self.heartbeat)
+                    if message is None or message.get("type") == "message":
+                        self._pull()
+            except Exception as e:
+                logging.warning(f"Event listener for '{self.namespace}' restarting: {e}")
+                time.sleep(1)
+
+    def events_after(self, last_id):
+        """Events newer than `last_id`, from the buffer or, if it has rotated past it, the stream."""
+        last = _parse_id(last_id) or (0, 0)
+        with self._cond:
+            if _parse_id(self._latest) <= last:
+                return []
+            if self._buffer and self._buffer[0][0] <= last:
+                return [(event_id, event_type, data) for parsed, event_id, event_type, data in self._buffer if parsed > last]
+        entries = self.r.xrange(self.key, min=f"({last[0]}-{last[1]}", max="+", count=REPLAY_LIMIT)
+        return [(event_id, fields.get("type", "message"), fields.get("data", "")) for event_id, fields in entries]
+
+    def wait(self, last_id, timeout):
+        """Block until there is an event newer than `last_id` or `timeout` passes."""
+        last = _parse_id(last_id) or (0, 0)
+        with self._cond:
+            return self._cond.wait_for(lambda: _parse_id(self._latest) > last, timeout=timeout)
+
+    def stream(self, last_id=None):
+        """SSE lines for one client, starting after `last_id` (default: only new events)."""
+        self.start()
+        last_id = last_id if _parse_id(last_id) else self.latest
+        with self._cond:
+            self.clients += 1
+        try:
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'last_id': last_id})}\n\n"
+            while True:
+                events = self.events_after(last_id)
+                for event_id, event_type, data in events:
+                    yield f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+                    last_id = event_id
+                if not events and _parse_id(self.latest) > (_parse_id(last_id) or (0, 0)):
+                    # Trimmed from the stream before this client caught up; skip ahead.
+                    last_id = self.latest
+                if not self.wait(last_id, self.heartbeat):
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+    def response(self):
+        """Flask streaming response resuming from the Last-Event-ID header (or `last_id` param)."""
+        last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
+        return Response(
+            stream_with_context(self.stream(last_id)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
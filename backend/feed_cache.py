@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class FeedCache:
+    """
+    Per-feed HTTP validator cache persisted in a Redis hash.
+
+    Each field is a feed URL; the value is a JSON object with the last
+    `etag`, `last_modified`, `content_hash` and the parsed `items` so an
+    unchanged feed can be reused without downloading or parsing it again.
+    """
+
+    def __init__(self, redis_client, key="pharma_feed_cache"):
+        self.r = redis_client
+        self.key = key
+        self._entries = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+
+    def load(self, urls):
+        """Read the cached entries for `urls` in one round trip."""
+        urls = list(urls)
+        if not urls:
+            return
+        for url, raw in zip(urls, self.r.hmget(self.key, urls)):
+            if raw:
+                try:
+                    self._entries[url] = json.loads(raw)
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignoring corrupt feed cache entry for {url}")
+
+    def get(self, url):
+        return self._entries.get(url)
+
+    def request_headers(self, url):
+        """Conditional request headers for `url`, empty when nothing is cached."""
+        entry = self._entries.get(url)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def lookup(self, result):
+        """
+        Return cached items for a fetch result that did not change, else None.
+
+        A 304 response or a 200 response whose body hashes to the stored
+        `content_hash` both count as a hit.
+        """
+        entry = self._entries.get(result.url)
+        if entry is None:
+            self.misses += 1
+            metrics.inc("scraper_feed_cache_total", result="miss")
+            return None
+
+        if result.status == 304:
+            self.hits += 1
+            self.not_modified += 1
+            metrics.inc("scraper_feed_cache_total", result="not_modified")
+            return entry.get("items", [])
+
+        if result.ok and content_hash(result.body) == entry.get("content_hash"):
+            self.hits += 1
+            metrics.inc("scraper_feed_cache_total", result="unchanged")
+            # Validators may rotate even when the body does not.
+            if (result.headers.get("etag", "") != entry.get("etag")
+                    or result.headers.get("last-modified", "") != entry.get("last_modified")):
+                self._store(result, entry.get("items", []))
+            return entry.get("items", [])
+
+        self.misses += 1
+        metrics.inc("scraper_feed_cache_total", result="miss")
+        return None
+
+    def put(self, result, items):
+        self._store(result, items)
+
+    def _store(self, result, items):
+        entry = {
+            "etag": result.headers.get("etag", ""),
+            "last_modified": result.headers.get("last-modified", ""),
+            "content_hash": content_hash(result.body),
+            "items": items,
+        }
+        self._entries[result.url] = entry
+        try:
+            self.r.hset(self.key, result.url, json.dumps(entry))
+        except Exception as e:
+            metrics.inc("scraper_errors_total", job="pharma", stage="feed_cache")
+            logging.error(f"Failed to update feed cache for {result.url}: {e}")
+
+    def summary(self):
+        return {"hits": self.hits, "not_modified": self.not_modified, "misses": self.misses}
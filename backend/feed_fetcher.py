@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import aiohttp
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+USER_AGENT = "Mozilla/5.0 (compatible; PharmaNewsBot/1.0)"
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    body: bytes = b""
+    headers: dict = field(default_factory=dict)  # response headers, names lower-cased
+    error: str = ""
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.error and 200 <= self.status < 300
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+class RateLimiter:
+    """Token bucket shared by all requests of one fetch run.
+
+    `rate` tokens are added per second up to `burst`; each request takes one.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def _fetch_one(session, url, limiter, host_limits, per_host, timeout, headers=None):
+    host = urlsplit(url).netloc
+    semaphore = host_limits.setdefault(host, asyncio.Semaphore(per_host))
+    result = FetchResult(url=url)
+    started = time.perf_counter()
+
+    async with semaphore:
+        await limiter.acquire()
+        try:
+            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+                result.status = resp.status
+                # Servers differ in casing ("ETag", "Etag"); a plain dict would keep theirs.
+                result.headers = {name.lower(): value for name, value in resp.headers.items()}
+                result.body = await resp.read()
+                if resp.status >= 400:
+                    result.error = f"HTTP {resp.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result.error = str(e) or e.__class__.__name__
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+async def fetch_all_async(urls, per_host=4, rate=8.0, burst=4, timeout=20, total_connections=32,
+                          headers_by_url=None):
+    """Fetch every URL concurrently over one pooled session.
+
+    Results come back in the same order as `urls`. Failures are reported in
+    `FetchResult.error` instead of being raised. `headers_by_url` adds extra
+    request headers per URL (e.g. conditional GET validators); a 304 reply
+    is returned with an empty body and no error.
+    """
+    headers_by_url = headers_by_url or {}
+    limiter = RateLimiter(rate, burst)
+    host_limits = {}
+    connector = aiohttp.TCPConnector(limit=total_connections, limit_per_host=per_host, ttl_dns_cache=300)
+
+    async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}) as session:
+        tasks = [
+            _fetch_one(session, url, limiter, host_limits, per_host, timeout, headers_by_url.get(url))
+            for url in urls
+        ]
+        return await asyncio.gather(*tasks)
+
+
+async def fetch_each_async(urls, emit, window=16, per_host=4, rate=8.0, burst=4, timeout=20, total_connections=32,
+                           headers_by_url=None):
+    """Fetch `urls` like `fetch_all_async`, handing each result to `emit` in URL order.
+
+    At most `window` fetches are started ahead of the result being emitted,
+    so memory is bounded however many URLs there are. `emit` may block (e.g.
+    on a full queue); it runs in a worker thread while other fetches go on.
+    """
+    headers_by_url = headers_by_url or {}
+    limiter = RateLimiter(rate, burst)
+    host_limits = {}
+    connector = aiohttp.TCPConnector(limit=total_connections, limit_per_host=per_host, ttl_dns_cache=300)
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    remaining = iter(urls)
+
+    async with aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}) as session:
+        def start_next():
+            url = next(remaining, None)
+            if url is not None:
+                pending.append(asyncio.ensure_future(
+                    _fetch_one(session, url, limiter, host_limits, per_host, timeout, headers_by_url.get(url))
+                ))
+
+        for _ in range(max(1, window)):
+            start_next()
+        while pending:
+            result = await pending.popleft()
+            start_next()
+            await loop.run_in_executor(None, emit, result)
+
+
+def fetch_each(urls, emit, **kwargs):
+    """Synchronous entry point; see `fetch_each_async`."""
+    asyncio.run(fetch_each_async(urls, emit, **kwargs))
+
+
+def fetch_all(urls, **kwargs):
+    """Synchronous entry point for scripts; see `fetch_all_async`."""
+    return asyncio.run(fetch_all_async(list(urls), **kwargs))
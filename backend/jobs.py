@@ -0,0 +1,176 @@
+import json
+import logging
+import threading
+import time
+
+from redis.exceptions import LockError
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_LOCK_PREFIX = "job_lock:"        # single-flight lock, held by the process running the job
+JOB_PENDING_PREFIX = "job_pending:"  # set while a run has been requested but not started
+JOB_STATUS_PREFIX = "job_status:"    # hash: state, timings, counters, last result/error
+
+INT_FIELDS = ("runs", "failures", "requests", "coalesced", "interval")
+FLOAT_FIELDS = ("started_at", "finished_at", "duration", "next_run_at")
+
+
+class Job:
+    """
+    A named, Redis-coordinated background job (e.g. one scraper).
+
+    `request()` marks a run as pending and starts a worker thread unless a
+    run is already in progress anywhere; requests arriving meanwhile only
+    leave the pending flag set, so any number of them coalesce into one
+    follow-up run. A Redis lock keeps at most one run going across all
+    processes, and `start_periodic()` requests a run whenever the last one
+    finished more than `interval` seconds ago.
+    """
+
+    def __init__(self, redis_client, name, run, interval=0, lock_timeout=900):
+        self.r = redis_client
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.lock_timeout = lock_timeout
+        self.lock_key = JOB_LOCK_PREFIX + name
+        self.pending_key = JOB_PENDING_PREFIX + name
+        self.status_key = JOB_STATUS_PREFIX + name
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.r.hset(self.status_key, "interval", int(interval))
+
+    def running(self):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return True
+        return bool(self.r.exists(self.lock_key))
+
+    def request(self, reason="manual"):
+        """Ask for a run; returns "started" or "coalesced"."""
+        # Pending is set before the lock is checked and re-checked by the
+        # worker after it releases the lock, so no request is ever lost.
+        pipe = self.r.pipeline(transaction=True)
+        pipe.set(self.pending_key, reason)
+        pipe.hincrby(self.status_key, "requests", 1)
+        pipe.execute()
+
+        with self._thread_lock:
+            busy = self._thread is not None and self._thread.is_alive()
+            if not busy and not self.r.exists(self.lock_key):
+                self._thread = threading.Thread(target=self._work, name=f"job-{self.name}", daemon=True)
+                self._thread.start()
+                return "started"
+        self.r.hincrby(self.status_key, "coalesced", 1)
+        logging.info(f"Job '{self.name}' already running; {reason} request coalesced into the next run.")
+        return "coalesced"
+
+    def _take_pending(self):
+        pipe = self.r.pipeline(transaction=True)
+        pipe.get(self.pending_key)
+        pipe.delete(self.pending_key)
+        reason, _ = pipe.execute()
+        return reason
+
+    def _work(self):
+        while True:
+            lock = self.r.lock(self.lock_key, timeout=self.lock_timeout, thread_local=False)
+            if not lock.acquire(blocking=False):
+                return  # another process is running it and will drain the pending flag
+            try:
+                reason = self._take_pending()
+                while reason is not None:
+                    self._run_once(lock, reason)
+                    reason = self._take_pending()
+            finally:
+                try:
+                    lock.release()
+                except LockError:
+                    logging.warning(f"Job '{self.name}' lost its lock before finishing.")
+            if not self.r.exists(self.pending_key):
+                return
+
+    def _run_once(self, lock, reason):
+        started = time.time()
+        self.r.hset(self.status_key, mapping={"state": "running", "reason": reason, "started_at": started})
+        logging.info(f"Job '{self.name}' started ({reason}).")
+
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(lock, stop), daemon=True)
+        heartbeat.start()
+        fields = {"state": "idle"}
+        try:
+            result = self.run()
+            fields["last_result"] = json.dumps(result, default=str)
+            fields["last_error"] = ""
+            failed = False
+        except Exception as e:
+            logging.error(f"Job '{self.name}' failed: {e}")
+            fields["last_error"] = str(e)
+            failed = True
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        finished = time.time()
+        fields.update(finished_at=finished, duration=round(finished - started, 3))
+        if self.interval:
+            fields["next_run_at"] = finished + self.interval
+        pipe = self.r.pipeline(transaction=True)
+        pipe.hset(self.status_key, mapping=fields)
+        pipe.hincrby(self.status_key, "runs", 1)
+        if failed:
+            pipe.hincrby(self.status_key, "failures", 1)
+        pipe.execute()
+        logging.info(f"Job '{self.name}' finished in {finished - started:.1f}s.")
+
+    def _heartbeat(self, lock, stop):
+        # Keep the lock alive for runs longer than its timeout.
+        while not stop.wait(self.lock_timeout / 3):
+            try:
+                lock.reacquire()
+            except LockError:
+                return
+
+    def status(self):
+        raw = self.r.hgetall(self.status_key)
+        status = {"name": self.name, "state": raw.get("state", "idle"), "reason": raw.get("reason")}
+        for field in INT_FIELDS:
+            status[field] = int(raw.get(field) or 0)
+        for field in FLOAT_FIELDS:
+            status[field] = float(raw[field]) if raw.get(field) else None
+        status["last_error"] = raw.get("last_error") or None
+        status["last_result"] = json.loads(raw["last_result"]) if raw.get("last_result") else None
+        status["running"] = self.running()
+        status["pending"] = bool(self.r.exists(self.pending_key))
+        return status
+
+    def start_periodic(self, check_every=30):
+        """
+        Request a run whenever the last one finished `interval` seconds ago.
+
+        A restart does not trigger a run by itself: while the last run
+        (by any process) finished less than `interval` ago, the loop only
+        sleeps until it is due.
+        """
+        if not self.interval:
+            return None
+
+        def loop():
+            while True:
+                wait = check_every
+                try:
+                    finished_at = float(self.r.hget(self.status_key, "finished_at") or 0)
+                    remaining = finished_at + self.interval - time.time()
+                    if remaining > 0:
+                        wait = min(check_every, remaining)
+                    elif not self.running():
+                        self.request("periodic")
+                except Exception as e:
+                    logging.warning(f"Periodic check for job '{self.name}' failed: {e}")
+                time.sleep(max(1, min(wait, self.interval)))
+
+        thread = threading.Thread(target=loop, name=f"job-{self.name}-schedule", daemon=True)
+        thread.start()
+        logging.info(f"Job '{self.name}' refreshes every {self.interval}s.")
+        return thread
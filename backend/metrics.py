@@ -0,0 +1,269 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, request
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# In-process metrics for the scrapers and APIs, rendered in the Prometheus
+# text format by each app's /metrics endpoint. The scrapers run inside the
+# API processes as jobs, so one registry per process sees both sides.
+STAGE_SECONDS = "scraper_stage_seconds"
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRICS = {
+    STAGE_SECONDS: ("histogram", "Time spent in one stage of a scraper run."),
+    "scraper_items_total": ("counter", "Items produced by the scrapers."),
+    "scraper_image_fallbacks_total": ("counter", "Products stored with the placeholder image."),
+    "scraper_feed_cache_total": ("counter", "Feed cache lookups by result (not_modified, unchanged, miss)."),
+    "scraper_errors_total": ("counter", "Scraper errors by stage."),
+    "scraper_runs_total": ("counter", "Finished scraper runs by outcome."),
+    "scraper_last_run_timestamp_seconds": ("gauge", "Unix time the last scraper run finished."),
+    "scraper_last_run_duration_seconds": ("gauge", "Wall-clock duration of the last scraper run."),
+    "scraper_last_run_success": ("gauge", "1 if the last scraper run succeeded, else 0."),
+    "api_requests_seconds": ("histogram", "API request handling time (streams: until the response starts)."),
+    "api_response_cache_total": ("counter", "Response cache lookups by result (hit, miss)."),
+}
+
+# Each run of a scraper also writes a JSON summary here: <job>-last-run.json
+# and one line per run appended to <job>-runs.jsonl.
+RUN_SUMMARY_DIR = os.environ.get(
+    "SCRAPER_RUN_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "runs")
+)
+
+
+def _labels(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Registry:
+    """Thread-safe counters, gauges and histograms keyed by name and labels."""
+
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._values = {}      # (name, labels) -> counter or gauge value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _labels(labels))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += seconds
+            histogram[-1] += 1
+
+    def snapshot(self):
+        """Copy of every series: `{(name, labels): value}` and `{(name, labels): (sum, count)}`."""
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (h[-2], h[-1]) for key, h in self._histograms.items()}
+        return values, histograms
+
+    def render(self):
+        """All series in the Prometheus text exposition format."""
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((key, list(h)) for key, h in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name, default_type):
+            if name in described:
+                return
+            described.add(name)
+            metric_type, help_text = METRICS.get(name, (default_type, ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for (name, labels), value in values:
+            describe(name, "untyped")
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), histogram in histograms:
+            describe(name, "histogram")
+            # Bucket counts are stored per bound already cumulative.
+            for bound, count in zip(self.buckets + (math.inf,), histogram[:len(self.buckets)] + [histogram[-1]]):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    REGISTRY.observe(name, seconds, **labels)
+
+
+def record_stage(job, stage, seconds):
+    REGISTRY.observe(STAGE_SECONDS, seconds, job=job, stage=stage)
+
+
+@contextmanager
+def span(job, stage):
+    """Time the enclosed block as `stage` of `job`'s runs."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(job, stage, time.perf_counter() - started)
+
+
+class RunSummary:
+    """What one scraper run changed in the registry, plus its result."""
+
+    def __init__(self, job):
+        self.job = job
+        self.result = None
+        self.started_at = time.time()
+        self._before = REGISTRY.snapshot()
+
+    def _mine(self, key):
+        name, labels = key
+        return name.startswith("scraper_") and dict(labels).get("job", self.job) == self.job
+
+    def finish(self, error=None):
+        values, histograms = REGISTRY.snapshot()
+        before_values, before_histograms = self._before
+        finished_at = time.time()
+
+        stages = {}
+        for key, (total, count) in histograms.items():
+            if key[0] != STAGE_SECONDS or not self._mine(key):
+                continue
+            prev_total, prev_count = before_histograms.get(key, (0.0, 0))
+            if count > prev_count:
+                stages[dict(key[1])["stage"]] = {
+                    "count": count - prev_count,
+                    "seconds": round(total - prev_total, 4),
+                }
+
+        counters = {}
+        for key, value in values.items():
+            name, labels = key
+            if METRICS.get(name, ("",))[0] != "counter" or name == "scraper_runs_total" or not self._mine(key):
+                continue
+            delta = value - before_values.get(key, 0)
+            if delta:
+                extra = {k: v for k, v in labels if k != "job"}
+                counters[name + _format_labels(sorted(extra.items()))] = delta
+
+        return {
+            "job": self.job,
+            "outcome": "error" if error else "ok",
+            "error": str(error) if error else None,
+            "started_at": self.started_at,
+            "finished_at": finished_at,
+            "duration_seconds": round(finished_at - self.started_at, 3),
+            "stages": dict(sorted(stages.items(), key=lambda item: -item[1]["seconds"])),
+            "counters": dict(sorted(counters.items())),
+            "result": self.result,
+        }
+
+
+def write_run_summary(summary, directory=None):
+    directory = directory or RUN_SUMMARY_DIR
+    try:
+        os.makedirs(directory, exist_ok=True)
+        body = json.dumps(summary, default=str)
+        with open(os.path.join(directory, f"{summary['job']}-last-run.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, default=str)
+        with open(os.path.join(directory, f"{summary['job']}-runs.jsonl"), "a", encoding="utf-8") as f:
+            f.write(body + "\n")
+    except OSError as e:
+        logging.error(f"Could not write the run summary for '{summary['job']}': {e}")
+
+
+@contextmanager
+def run_summary(job):
+    """
+    Wrap one scraper run: records its outcome metrics and writes its JSON
+    summary (stage timings, counter deltas, `run.result`) when it ends.
+
+    Counters without a `job` label (e.g. the feed cache) are attributed to
+    whichever run is active, so overlapping runs in one process share them.
+    """
+    run = RunSummary(job)
+    error = None
+    try:
+        yield run
+    except Exception as e:
+        error = e
+        inc("scraper_errors_total", job=job, stage="run")
+        raise
+    finally:
+        summary = run.finish(error)
+        inc("scraper_runs_total", job=job, outcome=summary["outcome"])
+        REGISTRY.set("scraper_last_run_timestamp_seconds", summary["finished_at"], job=job)
+        REGISTRY.set("scraper_last_run_duration_seconds", summary["duration_seconds"], job=job)
+        REGISTRY.set("scraper_last_run_success", 0 if error else 1, job=job)
+        write_run_summary(summary)
+        slowest = ", ".join(f"{stage}={info['seconds']:.2f}s" for stage, info in list(summary["stages"].items())[:5])
+        logging.info(f"Run summary for '{job}': {summary['outcome']} in {summary['duration_seconds']:.2f}s; "
+                     f"slowest stages: {slowest or 'none'}")
+
+
+def instrument(app):
+    """Time every request of a Flask app into `api_requests_seconds`."""
+
+    @app.before_request
+    def _start_timer():
+        request.environ["metrics.started"] = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = request.environ.get("metrics.started")
+        if started is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            observe("api_requests_seconds", time.perf_counter() - started,
+                    endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
+
+    return app
+
+
+def response():
+    """A Flask response with the whole registry in the Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
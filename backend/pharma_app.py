@@ -1,14 +1,26 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import redis
-import json
 import logging
-from datetime import datetime
+import os
+
+import metrics
+import pharma_scraper
+import sources
+from events import EventHub
+from jobs import Job
+from pharma_store import query_articles
+from response_cache import ResponseCache
+
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 500
+REFRESH_INTERVAL = int(os.environ.get("PHARMA_REFRESH_INTERVAL", "1800"))  # seconds; 0 disables
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
 CORS(app, resources={r"/*": {"origins": "http://localhost:8080"}})
+metrics.instrument(app)
 
 try:
     r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
@@ -18,8 +30,16 @@ except redis.ConnectionError as e:
     logging.error(f"Redis connection failed: {e}")
     r = None
 
+response_cache = ResponseCache(r, "pharma")
+
+scrape_job = None
+event_hub = EventHub(r, "pharma") if r else None
+if r:
+    scrape_job = Job(r, "pharma_scraper", lambda: pharma_scraper.refresh(r), interval=REFRESH_INTERVAL, lock_timeout=300)
+
 
 @app.route("/news", methods=["GET"])
+@response_cache.cached
 def get_news():
     if not r:
         return jsonify({"error": "Redis not connected"}), 503
@@ -29,54 +49,97 @@ def get_news():
     search = request.args.get("search", "").strip().lower()
 
     try:
-        news_json = r.get("pharma_news")
-        if not news_json:
-            return jsonify({"message": "No data found. Run pharma_scraper.py first."}), 404
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(MAX_PAGE_SIZE, max(1, int(request.args.get("limit", DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
 
-        news = json.loads(news_json)
-
-        # Filters
-        if company and company != "All":
-            news = [n for n in news if n["company"] == company]
-        if category and category != "All":
-            news = [n for n in news if n["category"] == category]
-        if search:
-            news = [n for n in news if search in n["title"].lower() or search in n["summary"].lower()]
+    try:
+        news, total = query_articles(
+            r,
+            company=company if company != "All" else "",
+            category=category if category != "All" else "",
+            search=search,
+            offset=offset,
+            limit=limit,
+        )
+        if news is None:
+            return jsonify({"message": "No data found. Run pharma_scraper.py first."}), 404
 
+        next_offset = offset + len(news) if offset + len(news) < total else None
         last_updated = r.get("pharma_last_updated") or "Unknown"
-        return jsonify({"news": news, "count": len(news), "last_updated": last_updated})
+        return jsonify({
+            "news": news,
+            "count": total,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": next_offset,
+            "last_updated": last_updated,
+        })
 
     except Exception as e:
         logging.error(f"Error in /news: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/news/stream", methods=["GET"])
+def stream_news():
+    """
+    Server-Sent Events: one `article` event per newly scraped article.
+    Reconnecting clients resume after their Last-Event-ID.
+    """
+    if not event_hub:
+        return jsonify({"error": "Redis not connected"}), 503
+    return event_hub.response()
+
+
 @app.route("/companies", methods=["GET"])
 def get_companies():
-    companies = [
-        "Pfizer", "Novartis", "Sanofi", "Takeda", "Merck",
-        "Bayer", "AbbVie", "Bristol Myers Squibb", "Johnson & Johnson",
-        "Roche", "Eli Lilly", "AstraZeneca", "Amgen"
-    ]
-    return jsonify(companies)
+    """Name and colour of each enabled source in the registry (sources.json plus the Redis overrides)."""
+    return jsonify([{"name": source.name, "color": source.color} for source in sources.load_sources(r)])
 
 
 @app.route("/refresh", methods=["POST"])
 def refresh_news():
-    """Trigger a fresh scrape on demand."""
+    """
+    Request a fresh scrape. Requests made while one is running are
+    coalesced into a single follow-up run.
+    """
+    if not scrape_job:
+        return jsonify({"error": "Redis not connected"}), 503
     try:
-        import subprocess
-        import sys
-        subprocess.Popen([sys.executable, "pharma_scraper.py"])
-        return jsonify({"message": "Scraper triggered. Check back in ~30 seconds."})
+        outcome = scrape_job.request("manual")
+        message = ("Scraper triggered. Check back in ~30 seconds." if outcome == "started"
+                   else "A scrape is already running; another run is queued after it.")
+        return jsonify({"message": message, "outcome": outcome, "job": scrape_job.status()}), 202
     except Exception as e:
+        logging.error(f"Error in /refresh: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/jobs", methods=["GET"])
+def get_jobs():
+    """Status of the scraper job: state, last run timings and result, counters."""
+    if not scrape_job:
+        return jsonify({"error": "Redis not connected"}), 503
+    return jsonify({"jobs": [scrape_job.status()]})
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus metrics: scraper stage timings, item/error/cache counters, request latency."""
+    return metrics.response()
+
+
 @app.route("/", methods=["GET"])
 def health():
     return jsonify({"status": "healthy", "service": "Pharma News API", "port": 5001})
 
 
 if __name__ == "__main__":
+    # The schedule starts only here, not on import (replay, tests, other
+    # tools import the app), and under the debug reloader only in the child
+    # process that serves requests.
+    if scrape_job and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        scrape_job.start_periodic()
     app.run(debug=True, port=5001)
\ No newline at end of file
@@ -1,116 +1,407 @@
 import feedparser
 import redis
-import json
 import logging
+import os
+import re
 from datetime import datetime
+from email.utils import parsedate_to_datetime
 import time
 
+import dedupe
+import metrics
+import sources
+# CATEGORY_KEYWORDS and categorize are re-exported for existing importers.
+from categorizer import CATEGORY_KEYWORDS, categorize, categorize_batch
+from feed_cache import FeedCache
+from feed_fetcher import fetch_each
+from pharma_store import article_id, ingest_articles
+from pipeline import Stage, run_pipeline
+from response_cache import bump_version
+from timing import PhaseTimer
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-COMPANIES = [
-    "Pfizer", "Novartis", "Sanofi", "Takeda", "Merck",
-    "Bayer", "AbbVie", "Bristol Myers Squibb", "Johnson & Johnson",
-    "Roche", "Eli Lilly", "AstraZeneca", "Amgen"
+__all__ = [
+    "CATEGORY_KEYWORDS", "COMPANIES", "COMPANY_COLORS", "DEFAULT_SOURCES", "FEED_URL_TEMPLATE",
+    "MAX_ARTICLES_PER_COMPANY", "ArticleWriter", "build_feed_url", "categorize", "categorize_items",
+    "clean_entries", "parse_dates", "parse_feed_entries", "refresh", "resolve_sources",
+    "scrape_pharma_news", "stream_pharma_news", "take_unseen",
 ]
 
-COMPANY_COLORS = {
-    "Pfizer": "#0093D0", "Novartis": "#EC0016", "Sanofi": "#7B2D8B",
-    "Takeda": "#E4002B", "Merck": "#009B77", "Bayer": "#10A0E3",
-    "AbbVie": "#071D49", "Bristol Myers Squibb": "#003865",
-    "Johnson & Johnson": "#CC0000", "Roche": "#0066CC",
-    "Eli Lilly": "#D52B1E", "AstraZeneca": "#830051", "Amgen": "#002A5C"
-}
-
-CATEGORY_KEYWORDS = {
-    "Drug Launch": ["launch", "launched", "approved", "approval", "fda approved", "new drug", "marketed", "clearance", "nda", "bla"],
-    "Innovation": ["discovery", "breakthrough", "innovation", "research", "clinical trial", "phase 1", "phase 2", "phase 3", "study", "data", "results"],
-    "Events": ["conference", "event", "summit", "webinar", "meeting", "symposium", "congress", "asco", "aha", "esc"],
-    "Acquisition": ["acquisition", "acquires", "merger", "deal", "partnership", "collaboration", "agreement", "license"],
-    "Earnings": ["earnings", "revenue", "quarterly", "financial results", "q1", "q2", "q3", "q4", "guidance"]
-}
-
-def categorize(title, summary=""):
-    text = (title + " " + summary).lower()
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        if any(kw in text for kw in keywords):
-            return category
-    return "General"
-
-def scrape_pharma_news():
-    all_news = []
+# Tracked companies come from the source registry (sources.json plus the
+# Redis overrides, see sources.py). These copies of the file registry are
+# kept for existing importers.
+DEFAULT_SOURCES = sources.load_sources()
+COMPANIES = [source.name for source in DEFAULT_SOURCES]
+COMPANY_COLORS = {source.name: source.color for source in DEFAULT_SOURCES}
+
+# Override with e.g. "http://127.0.0.1:8000/{query}.xml" to scrape fixture feeds
+# served from a local stand-in server instead of Google News. Sources with
+# their own `url_template` keep it.
+FEED_URL_TEMPLATE = os.environ.get(
+    "PHARMA_FEED_URL",
+    "https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
+)
+
+MAX_ARTICLES_PER_COMPANY = 6
+
+# Items kept per parsed feed, as a multiple of the source's cap. Slack so
+# links that another company already claimed can be skipped when the feed
+# is reused from the cache.
+PARSE_DEPTH_FACTOR = 3
+FEED_PARSE_DEPTH = MAX_ARTICLES_PER_COMPANY * PARSE_DEPTH_FACTOR
+
+# feedparser holds the GIL, so extra parse threads only help while other stages wait on I/O.
+PARSE_WORKERS = int(os.environ.get("PHARMA_PARSE_WORKERS", "1"))
+FETCH_WINDOW = 16   # feeds fetched ahead of the slowest pipeline stage
+STORE_BATCH = 200   # articles per ingest_articles call during a refresh
+
+
+def resolve_sources(companies=None):
+    """`sources.Source`s for company names (or sources); default: the file registry."""
+    if companies is None:
+        return list(DEFAULT_SOURCES)
+    by_name = {source.name: source for source in DEFAULT_SOURCES}
+    return [
+        company if isinstance(company, sources.Source) else by_name.get(company) or sources.Source(company)
+        for company in companies
+    ]
+
+
+def build_feed_url(company, template=FEED_URL_TEMPLATE):
+    return resolve_sources([company])[0].feed_url(template)
+
+
+def clean_entries(company, entries, limit=FEED_PARSE_DEPTH, color=None):
+    """
+    Strip the markup of up to `limit` entries with distinct links and split
+    the outlet off their titles. Returns the items, their dates still raw,
+    and the full title/summary texts the categorizer scores.
+    """
+    items = []
+    texts = []
     seen_links = set()
+    color = color or COMPANY_COLORS.get(company, sources.DEFAULT_COLOR)
+
+    for entry in entries:
+        link = entry.get("link", "")
+        if link in seen_links:
+            continue
+        seen_links.add(link)
+
+        title = entry.get("title", "No title")
+        summary = entry.get("summary", "")
+
+        # Clean up summary (Google News adds HTML sometimes)
+        summary = re.sub(r'<[^>]+>', '', summary).strip()
+
+        source = ""
+        if hasattr(entry, "source") and entry.source:
+            source = entry.source.get("title", "")
+        if not source and " - " in title:
+            source = title.rsplit(" - ", 1)[-1]
+            title = title.rsplit(" - ", 1)[0]
+
+        news_item = {
+            "id": article_id(link),
+            "company": company,
+            "company_color": color,
+            "title": title.strip(),
+            "summary": summary[:300] + "..." if len(summary) > 300 else summary,
+            "link": link,
+            "published": entry.get("published", ""),
+            "timestamp": None,
+            "source": source,
+        }
 
-    for company in COMPANIES:
-        logging.info(f"Scraping news for: {company}")
-        query = company.replace(" ", "+") + "+pharmaceutical+drug"
-        rss_url = f"https://news.google.com/rss/search?q={query}&hl=en-US&gl=US&ceid=US:en"
+        items.append(news_item)
+        texts.append({"title": title, "summary": summary})
 
+        if len(items) >= limit:
+            break
+
+    return items, texts
+
+
+def parse_dates(items):
+    """Format each item's raw RSS date and set its `timestamp` (now, when unparseable)."""
+    for item in items:
         try:
-            feed = feedparser.parse(rss_url)
-            count = 0
-
-            for entry in feed.entries:
-                link = entry.get("link", "")
-                if link in seen_links:
-                    continue
-                seen_links.add(link)
-
-                title = entry.get("title", "No title")
-                summary = entry.get("summary", "")
-
-                # Clean up summary (Google News adds HTML sometimes)
-                import re
-                summary = re.sub(r'<[^>]+>', '', summary).strip()
-
-                published_raw = entry.get("published", "")
-                try:
-                    from email.utils import parsedate_to_datetime
-                    dt = parsedate_to_datetime(published_raw)
-                    published = dt.strftime("%b %d, %Y %I:%M %p")
-                    timestamp = dt.timestamp()
-                except:
-                    published = published_raw
-                    timestamp = time.time()
-
-                source = ""
-                if hasattr(entry, "source") and entry.source:
-                    source = entry.source.get("title", "")
-                if not source and " - " in title:
-                    source = title.rsplit(" - ", 1)[-1]
-                    title = title.rsplit(" - ", 1)[0]
-
-                news_item = {
-                    "id": f"{company}_{count}_{int(timestamp)}",
-                    "company": company,
-                    "company_color": COMPANY_COLORS.get(company, "#333333"),
-                    "title": title.strip(),
-                    "summary": summary[:300] + "..." if len(summary) > 300 else summary,
-                    "link": link,
-                    "published": published,
-                    "timestamp": timestamp,
-                    "source": source,
-                    "category": categorize(title, summary)
-                }
-
-                all_news.append(news_item)
-                count += 1
-
-                if count >= 6:  # Max 6 articles per company
-                    break
-
-            logging.info(f"  → {count} articles found for {company}")
-            time.sleep(0.5)  # polite delay between companies
+            dt = parsedate_to_datetime(item["published"])
+            item["published"] = dt.strftime("%b %d, %Y %I:%M %p")
+            item["timestamp"] = dt.timestamp()
+        except (TypeError, ValueError):
+            item["timestamp"] = time.time()
+    return items
 
-        except Exception as e:
-            logging.error(f"Error scraping {company}: {e}")
+
+def categorize_items(items, texts):
+    for item, category in zip(items, categorize_batch(texts)):
+        item["category"] = category
+    return items
+
+
+def parse_feed_entries(company, feed, limit=FEED_PARSE_DEPTH, timer=None, color=None):
+    """Turn the entries of one parsed feed into at most `limit` news items."""
+    items, texts = clean_entries(company, feed.entries, limit, color)
+    parse_dates(items)
+
+    started = time.perf_counter()
+    categorize_items(items, texts)
+    if timer is not None:
+        timer.record("categorize", time.perf_counter() - started)
+
+    return items
+
+
+def take_unseen(items, seen_links, limit=MAX_ARTICLES_PER_COMPANY, seen_stories=None):
+    """
+    Keep up to `limit` items whose link no earlier company has claimed.
+
+    With a `dedupe.NearDuplicateIndex` of the stories taken so far, items
+    that are near-duplicates of one are still kept (the store groups them
+    into that story) but do not count towards `limit`.
+    """
+    taken = []
+    stories = 0
+    for item in items:
+        if item["link"] in seen_links:
             continue
+        seen_links.add(item["link"])
+        taken.append(item)
+        if seen_stories is not None:
+            fp = dedupe.fingerprint(item)
+            buckets = dedupe.lsh_buckets(fp)
+            duplicate = seen_stories.find(fp, buckets) is not None
+            seen_stories.add(item["link"], fp, buckets)
+            if duplicate:
+                continue
+        stories += 1
+        if stories >= limit:
+            break
+    return taken
+
+
+class FeedBatch:
+    """One source's feed on its way through the ingest pipeline."""
+
+    def __init__(self, source, result, items=None):
+        self.source = source
+        self.result = result
+        self.cached = items is not None
+        self.items = items
+        self.entries = None
+        self.texts = None
+
+    def __str__(self):
+        return self.source.name
+
+
+def stream_pharma_news(source_list, store, feed_url_template=FEED_URL_TEMPLATE, cache=None, timer=None,
+                       parse_workers=PARSE_WORKERS, window=FETCH_WINDOW, flush=None, **fetch_options):
+    """
+    Run the feeds of `source_list` through the ingest pipeline and hand
+    each source's claimed articles to `store(source, items)`, in list order;
+    `flush()`, if given, runs once after the last `store` call.
+
+        fetch (at most `window` feeds ahead) -> feed_parse (`parse_workers`
+        threads) -> clean -> parse_date -> categorize -> claim -> store
+
+    Stages are joined by bounded queues, so memory does not grow with the
+    number of sources. Claim runs in list order: a link goes to the first
+    source that has it, and near-duplicates do not count towards a source's
+    `max_articles`. With a `FeedCache`, feeds are requested conditionally and
+    a 304 or unchanged body skips straight to claim with the cached items.
+    `fetch_options` go to `feed_fetcher.fetch_each` (per_host, rate, burst,
+    timeout); stage times go to `timer`.
+    """
+    timer = timer or PhaseTimer("pharma")
+    seen_links = set()
+    seen_stories = dedupe.NearDuplicateIndex()
+
+    urls = [source.feed_url(feed_url_template) for source in source_list]
+    headers_by_url = {}
+    if cache is not None:
+        cache.load(urls)
+        headers_by_url = {url: cache.request_headers(url) for url in urls}
+
+    def produce(emit):
+        remaining = iter(source_list)
+
+        def on_result(result):
+            source = next(remaining)
+            cached_items = None
+            if cache is not None and (result.ok or result.not_modified):
+                cached_items = cache.lookup(result)
+            if cached_items is None and not result.ok:
+                metrics.inc("scraper_errors_total", job="pharma", stage="feed_fetch")
+                logging.error(f"Error scraping {source.name}: {result.error or result.status}")
+                return
+            emit(FeedBatch(source, result, cached_items))
+
+        logging.info(f"Fetching {len(urls)} feeds through the ingest pipeline...")
+        started = time.perf_counter()
+        with timer.phase("feed_fetch"):
+            fetch_each(urls, on_result, window=window, headers_by_url=headers_by_url, **fetch_options)
+        logging.info(f"Fetched {len(urls)} feeds in {time.perf_counter() - started:.2f}s")
+
+    def parse(batch):
+        if not batch.cached:
+            batch.entries = feedparser.parse(batch.result.body).entries
+        return batch
+
+    def clean(batch):
+        if not batch.cached:
+            depth = batch.source.max_articles * PARSE_DEPTH_FACTOR
+            batch.items, batch.texts = clean_entries(batch.source.name, batch.entries, depth, batch.source.color)
+            batch.entries = None
+        return batch
+
+    def parse_date(batch):
+        if not batch.cached:
+            parse_dates(batch.items)
+        return batch
+
+    def categorize_stage(batch):
+        if not batch.cached:
+            categorize_items(batch.items, batch.texts)
+            batch.texts = None
+            if cache is not None:
+                cache.put(batch.result, batch.items)
+        return batch
+
+    def claim(batch):
+        items = take_unseen(batch.items, seen_links, batch.source.max_articles, seen_stories)
+        origin = "cached" if batch.cached else "fetched"
+        logging.info(f"  → {len(items)} articles found for {batch.source.name} ({origin}, {batch.result.elapsed:.2f}s)")
+        metrics.inc("scraper_items_total", len(items), job="pharma", kind="articles")
+        batch.items = items
+        batch.result = None
+        return batch
+
+    def store_batch(batch):
+        store(batch.source, batch.items)
+        return batch
+
+    stages = [
+        Stage("feed_parse", parse, workers=parse_workers),
+        Stage("clean", clean),
+        Stage("parse_date", parse_date),
+        Stage("categorize", categorize_stage),
+        Stage("claim", claim, ordered=True),
+        Stage("store", store_batch, close=flush),
+    ]
+    run_pipeline("pharma", produce, stages, timer=timer)
+
+    if cache is not None:
+        stats = cache.summary()
+        logging.info(f"Feed cache: {stats['hits']} hits ({stats['not_modified']} not modified), "
+                     f"{stats['misses']} misses")
+
+
+def scrape_pharma_news(companies=None, feed_url_template=FEED_URL_TEMPLATE, cache=None, timer=None,
+                       **pipeline_options):
+    """
+    Scrape the feeds of `companies` (names or `sources.Source`s; default:
+    every source in the file registry) and return the claimed articles,
+    newest first. See `stream_pharma_news` for the pipeline and options.
+    """
+    timer = timer or PhaseTimer("pharma")
+    all_news = []
+    stream_pharma_news(resolve_sources(companies), lambda source, items: all_news.extend(items),
+                       feed_url_template=feed_url_template, cache=cache, timer=timer, **pipeline_options)
 
     # Sort by most recent first
     all_news.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
     logging.info(f"Total articles scraped: {len(all_news)}")
+    timer.log("Pharma scrape phases")
     return all_news
 
 
+class ArticleWriter:
+    """
+    Ingests articles in batches of `batch_size` while the pipeline is still
+    scraping. A failed batch stays pending for the next flush and is
+    recorded in `errors`, since the pipeline only logs stage exceptions.
+    """
+
+    def __init__(self, r, batch_size=STORE_BATCH, now=None):
+        self.r = r
+        self.batch_size = batch_size
+        self.now = now
+        self.pending = []
+        self.scraped = 0
+        self.stats = {"added": 0, "updated": 0, "unchanged": 0, "expired": 0, "clustered": 0}
+        self.errors = []
+
+    def add(self, items):
+        self.pending.extend(items)
+        self.scraped += len(items)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        try:
+            with metrics.span("pharma", "redis_write"):
+                stats = ingest_articles(self.r, self.pending, now=self.now)
+                self.pending = []
+                self.r.set("pharma_last_updated", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                bump_version(self.r, "pharma")
+        except Exception as e:
+            self.errors.append(e)
+            raise
+        for key, value in stats.items():
+            self.stats[key] = self.stats.get(key, 0) + value
+
+
+def refresh(r, now=None):
+    """
+    Scrape the sources that are due, most active first, merging their
+    articles into Redis as they arrive; returns the ingest stats.
+    """
+    with metrics.run_summary("pharma") as run:
+        now = time.time() if now is None else now
+        registry = sources.load_sources(r)
+        state = sources.load_state(r, registry)
+        due = sources.schedule(registry, state, now)
+        if not due:
+            logging.info(f"None of the {len(registry)} pharma sources is due yet.")
+            run.result = {"scraped": 0, "sources": 0}
+            return run.result
+
+        writer = ArticleWriter(r, now=now)
+        new_articles = {}  # source name -> articles published since its previous fetch
+
+        def store(source, items):
+            last_run = state.get(source.name, {}).get("last_run", 0)
+            new_articles[source.name] = sum(1 for item in items if item["timestamp"] > last_run)
+            writer.add(items)
+
+        logging.info(f"Scraping {len(due)} of {len(registry)} pharma sources")
+        timer = PhaseTimer("pharma")
+        stream_pharma_news(due, store, cache=FeedCache(r), timer=timer, flush=writer.flush)
+        timer.log("Pharma refresh phases")
+        if writer.pending:
+            # Sources are not marked as fetched, so the next run scrapes them again.
+            last_error = writer.errors[-1] if writer.errors else "not flushed"
+            raise RuntimeError(f"{len(writer.pending)} articles could not be stored "
+                               f"({len(writer.errors)} failed writes, last: {last_error})")
+        sources.record_fetches(r, state, new_articles, now)
+
+        if not writer.scraped:
+            logging.warning("No news data scraped.")
+            run.result = {"scraped": 0, "sources": len(due)}
+            return run.result
+
+        stats = writer.stats
+        logging.info(f"Merged {writer.scraped} articles into 'pharma_articles': "
+                     f"{stats['added']} added ({stats['clustered']} joined an existing story), "
+                     f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['expired']} expired")
+        run.result = dict(stats, scraped=writer.scraped, sources=len(due))
+        return run.result
+
 if __name__ == "__main__":
     try:
         r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
@@ -120,13 +411,5 @@ if __name__ == "__main__":
         logging.error("Redis not running! Start Redis first.")
         exit(1)
 
-    news_data = scrape_pharma_news()
-
-    if news_data:
-        r.set("pharma_news", json.dumps(news_data))
-        r.set("pharma_last_updated", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-        logging.info(f"Stored {len(news_data)} articles in Redis under 'pharma_news'")
-    else:
-        logging.warning("No news data scraped.")
-
+    refresh(r)
     logging.info("Pharma scraper finished.")
\ No newline at end of file
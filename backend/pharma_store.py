@@ -0,0 +1,406 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import codec
+import dedupe
+from events import add_events
+from search_index import SearchIndex
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+ARTICLES_KEY = "pharma_articles"            # hash: article id -> article JSON
+ARTICLES_BY_TIME_KEY = "pharma_articles_by_time"  # zset: article id -> published timestamp
+LEGACY_NEWS_KEY = "pharma_news"             # full JSON list written by older scrapers
+
+# Near-duplicate articles (one wire story from several outlets, or returned
+# for several company queries) are grouped into stories. A story's id is
+# the id of its representative, its earliest-published member; the filter
+# indexes below hold story ids only, so /news lists each story once.
+STORIES_BY_TIME_KEY = "pharma_stories_by_time"    # zset: story id -> representative's timestamp
+STORY_PREFIX = "pharma_story:"                    # zset per story: member article id -> timestamp
+STORY_OF_KEY = "pharma_story_of"                  # hash: article id -> story id
+FINGERPRINTS_KEY = "pharma_fingerprints"          # hash: article id -> dedupe fingerprint JSON
+LSH_PREFIX = "pharma_lsh:"                        # set per LSH bucket: article ids
+
+# Per-company and per-category zsets (story id -> representative timestamp).
+# A story is listed under every member's company and its representative's
+# category, so filters are set intersections.
+COMPANY_INDEX_PREFIX = "pharma_idx:company:"
+CATEGORY_INDEX_PREFIX = "pharma_idx:category:"
+ARTICLES_VERSION_KEY = "pharma_articles:version"  # bumped whenever the store changes
+INDEX_VERSION_KEY = "pharma_idx:version"
+INDEX_VERSION = "2"
+QUERY_TMP_PREFIX = "pharma_idx:tmp:"
+QUERY_TMP_TTL = 30
+
+RETENTION_DAYS = float(os.environ.get("PHARMA_RETENTION_DAYS", "14"))
+MAX_DUPLICATES = 10  # duplicates listed per story in /news (source_count counts all)
+
+# In-process full-text index, rebuilt when ARTICLES_VERSION_KEY moves.
+_search_lock = threading.Lock()
+_search_state = {"version": None, "index": None}
+
+
+def article_id(link):
+    """Stable, content-derived article id: the same link always maps to the same id."""
+    return hashlib.sha1(link.encode("utf-8")).hexdigest()[:16]
+
+
+def company_index(company):
+    return COMPANY_INDEX_PREFIX + company
+
+
+def category_index(category):
+    return CATEGORY_INDEX_PREFIX + category
+
+
+def story_key(story_id):
+    return STORY_PREFIX + story_id
+
+
+def _encode(article):
+    return json.dumps(article, sort_keys=True)
+
+
+def _representative(members):
+    return min(members, key=lambda article: (article["timestamp"], article["id"]))
+
+
+def _story_index_keys(members):
+    rep = _representative(members)
+    keys = {STORIES_BY_TIME_KEY, category_index(rep["category"])}
+    keys.update(company_index(article["company"]) for article in members)
+    return rep, keys
+
+
+def _unindex_story(pipe, members):
+    """Remove a story (given its current members) from the filter indexes."""
+    if not members:
+        return
+    rep, keys = _story_index_keys(members)
+    for key in keys:
+        pipe.zrem(key, rep["id"])
+    pipe.delete(story_key(rep["id"]))
+
+
+def _index_story(pipe, members):
+    """Write a story's membership and index entries; returns its (new) id."""
+    rep, keys = _story_index_keys(members)
+    for key in keys:
+        pipe.zadd(key, {rep["id"]: rep["timestamp"]})
+    pipe.zadd(story_key(rep["id"]), {article["id"]: article["timestamp"] for article in members})
+    pipe.hset(STORY_OF_KEY, mapping={article["id"]: rep["id"] for article in members})
+    return rep["id"]
+
+
+def _add_fingerprint(pipe, article_key, fp, buckets):
+    pipe.hset(FINGERPRINTS_KEY, article_key, json.dumps(dedupe.encode(fp)))
+    for bucket in buckets:
+        pipe.sadd(LSH_PREFIX + bucket, article_key)
+
+
+def _remove_fingerprint(pipe, article_key, fp):
+    pipe.hdel(FINGERPRINTS_KEY, article_key)
+    for bucket in dedupe.lsh_buckets(fp):
+        pipe.srem(LSH_PREFIX + bucket, article_key)
+
+
+def _decode_all(raws):
+    return [json.loads(raw) if raw else None for raw in raws]
+
+
+def rebuild_indexes(r):
+    """Recreate stories, fingerprints and the company/category indexes from the stored articles."""
+    articles = [json.loads(raw) for raw in r.hvals(ARTICLES_KEY)]
+    articles.sort(key=lambda article: (article["timestamp"], article["id"]))
+
+    pipe = r.pipeline(transaction=True)
+    for pattern in (COMPANY_INDEX_PREFIX, CATEGORY_INDEX_PREFIX, STORY_PREFIX, LSH_PREFIX):
+        for key in r.scan_iter(match=pattern + "*"):
+            pipe.delete(key)
+    pipe.delete(STORIES_BY_TIME_KEY, STORY_OF_KEY, FINGERPRINTS_KEY)
+
+    index = dedupe.NearDuplicateIndex()
+    stories = {}  # representative id -> members
+    story_of = {}
+    for article in articles:
+        fp = dedupe.fingerprint(article)
+        buckets = dedupe.lsh_buckets(fp)
+        match = index.find(fp, buckets)
+        story = story_of[match] if match else article["id"]
+        story_of[article["id"]] = story
+        stories.setdefault(story, []).append(article)
+        index.add(article["id"], fp, buckets)
+        _add_fingerprint(pipe, article["id"], fp, buckets)
+    for members in stories.values():
+        _index_story(pipe, members)
+    pipe.set(INDEX_VERSION_KEY, INDEX_VERSION)
+    pipe.execute()
+    logging.info(f"Rebuilt pharma indexes: {len(articles)} articles in {len(stories)} stories")
+
+
+def _load_stories(r, story_ids):
+    """Current members of each story, as `{story id: {article id: article}}`."""
+    story_ids = list(story_ids)
+    pipe = r.pipeline(transaction=False)
+    for story in story_ids:
+        pipe.zrange(story_key(story), 0, -1)
+    member_ids = pipe.execute()
+    wanted = sorted({member for ids in member_ids for member in ids})
+    stored = dict(zip(wanted, _decode_all(r.hmget(ARTICLES_KEY, wanted)))) if wanted else {}
+    return {
+        story: {member: stored[member] for member in ids if stored.get(member) is not None}
+        for story, ids in zip(story_ids, member_ids)
+    }
+
+
+def ingest_articles(r, articles, retention_days=RETENTION_DAYS, now=None):
+    """
+    Merge `articles` into the Redis article store.
+
+    Only articles that are new or whose stored JSON differs are written, and
+    anything published before the retention window is trimmed. New articles
+    are matched against the stored ones through the LSH buckets of their
+    fingerprints and join the story of a near-duplicate, or start their own.
+    All writes go through one MULTI/EXEC pipeline so readers never see a
+    half-applied run. Returns a dict with `added`, `updated`, `unchanged`,
+    `expired` and `clustered` (new articles that joined an existing story).
+    """
+    now = time.time() if now is None else now
+    cutoff = now - retention_days * 86400
+
+    if r.get(INDEX_VERSION_KEY) != INDEX_VERSION:
+        rebuild_indexes(r)
+
+    encoded = {}
+    for article in articles:
+        if article.get("timestamp", 0) < cutoff:
+            continue
+        article["id"] = article_id(article["link"])
+        encoded[article["id"]] = (article, _encode(article))
+
+    ids = list(encoded)
+    existing = r.hmget(ARTICLES_KEY, ids) if ids else []
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "expired": 0, "clustered": 0}
+
+    changed = {}  # article id -> article, for new and updated articles
+    new_ids = []
+    for article_key, stored in zip(ids, existing):
+        article, payload = encoded[article_key]
+        if stored == payload:
+            stats["unchanged"] += 1
+            continue
+        stats["added" if stored is None else "updated"] += 1
+        changed[article_key] = article
+        if stored is None:
+            new_ids.append(article_key)
+    expired = r.zrangebyscore(ARTICLES_BY_TIME_KEY, "-inf", f"({cutoff}")
+
+    # Candidates for every new article, loaded in two round trips.
+    new_ids.sort(key=lambda key: (changed[key]["timestamp"], key))
+    fingerprints = {key: dedupe.fingerprint(changed[key]) for key in new_ids}
+    buckets = {key: dedupe.lsh_buckets(fp) for key, fp in fingerprints.items()}
+    all_buckets = sorted({bucket for key_buckets in buckets.values() for bucket in key_buckets})
+    candidates = set()
+    if all_buckets:
+        pipe = r.pipeline(transaction=False)
+        for bucket in all_buckets:
+            pipe.smembers(LSH_PREFIX + bucket)
+        for members in pipe.execute():
+            candidates.update(members)
+    candidates = sorted(candidates - set(expired))
+    index = dedupe.NearDuplicateIndex()
+    story_of = {}
+    if candidates:
+        raw_fps = r.hmget(FINGERPRINTS_KEY, candidates)
+        for candidate, story in zip(candidates, r.hmget(STORY_OF_KEY, candidates)):
+            story_of[candidate] = story or candidate
+        for candidate, raw in zip(candidates, raw_fps):
+            if raw:
+                index.add(candidate, dedupe.decode(json.loads(raw)))
+
+    # Stories touched by this run: new members join, updated or expired ones
+    # change; each is unindexed with its old members and indexed anew.
+    joins = {}
+    for key in new_ids:
+        match = index.find(fingerprints[key], buckets[key])
+        story_of[key] = story_of[match] if match else key
+        if match:
+            stats["clustered"] += 1
+        joins.setdefault(story_of[key], []).append(key)
+        index.add(key, fingerprints[key], buckets[key])
+    updated_ids = [key for key in changed if key not in fingerprints]
+    previous = expired + updated_ids
+    stored_story = r.hmget(STORY_OF_KEY, previous) if previous else []
+    touched = set(joins) | {story or key for key, story in zip(previous, stored_story)}
+    before = _load_stories(r, touched)
+    expired_set = set(expired)
+
+    events = []
+    pipe = r.pipeline(transaction=True)
+    for story in sorted(touched):
+        _unindex_story(pipe, list(before[story].values()))
+
+    old_fps = _decode_all(r.hmget(FINGERPRINTS_KEY, previous)) if previous else []
+    for article_key, raw in zip(previous, old_fps):
+        if raw:
+            _remove_fingerprint(pipe, article_key, dedupe.decode(raw))
+    for article_key in updated_ids:
+        fingerprints[article_key] = dedupe.fingerprint(changed[article_key])
+        buckets[article_key] = dedupe.lsh_buckets(fingerprints[article_key])
+
+    for article_key, article in changed.items():
+        pipe.hset(ARTICLES_KEY, article_key, encoded[article_key][1])
+        pipe.zadd(ARTICLES_BY_TIME_KEY, {article_key: article["timestamp"]})
+        _add_fingerprint(pipe, article_key, fingerprints[article_key], buckets[article_key])
+
+    for story in sorted(touched):
+        members = {key: changed.get(key, article) for key, article in before[story].items() if key not in expired_set}
+        members.update((key, changed[key]) for key in joins.get(story, []))
+        if not members:
+            continue
+        story_id = _index_story(pipe, list(members.values()))
+        for key in joins.get(story, []):
+            if not before[story] and key == story:
+                events.append(("article", changed[key]))
+            else:
+                events.append(("duplicate", {"story": story_id, "article": changed[key], "source_count": len(members)}))
+
+    if expired:
+        stats["expired"] = len(expired)
+        pipe.hdel(ARTICLES_KEY, *expired)
+        pipe.zrem(ARTICLES_BY_TIME_KEY, *expired)
+        pipe.hdel(STORY_OF_KEY, *expired)
+
+    if stats["added"] or stats["updated"] or stats["expired"]:
+        pipe.incr(ARTICLES_VERSION_KEY)
+    # New stories, and articles joining one, are pushed to /news/stream subscribers.
+    add_events(pipe, "pharma", events)
+    # The incremental store supersedes the old full-list blob.
+    pipe.delete(LEGACY_NEWS_KEY)
+    pipe.execute()
+    return stats
+
+
+def _unique(values):
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def _fetch(r, ids):
+    """
+    Story representatives for `ids`, each with `source_count` (articles in
+    the story), the distinct `sources` and `companies`, and up to
+    MAX_DUPLICATES `duplicates` (the other members, oldest first).
+    """
+    if not ids:
+        return []
+    pipe = r.pipeline(transaction=False)
+    pipe.hmget(ARTICLES_KEY, ids)
+    for story in ids:
+        pipe.zrange(story_key(story), 0, -1)
+    raws, *members = pipe.execute()
+    others = sorted({member for story, story_members in zip(ids, members) for member in story_members if member != story})
+    stored = dict(zip(others, r.hmget(ARTICLES_KEY, others))) if others else {}
+
+    articles = []
+    for story, raw, story_members in zip(ids, raws, members):
+        if not raw:
+            continue
+        article = codec.loads(raw)
+        duplicates = [codec.loads(stored[member]) for member in story_members if member != story and stored.get(member)]
+        group = [article] + duplicates
+        article["source_count"] = len(group)
+        article["sources"] = _unique(item.get("source") for item in group)
+        article["companies"] = _unique(item.get("company") for item in group)
+        article["duplicates"] = [
+            {field: item.get(field) for field in ("id", "title", "link", "source", "company", "published")}
+            for item in duplicates[:MAX_DUPLICATES]
+        ]
+        articles.append(article)
+    return articles
+
+
+def get_search_index(r):
+    """
+    Return the in-process `SearchIndex` over story representatives,
+    rebuilding it if the store changed.
+    """
+    version = r.get(ARTICLES_VERSION_KEY) or "0"
+    with _search_lock:
+        if _search_state["index"] is None or _search_state["version"] != version:
+            ids = r.zrange(STORIES_BY_TIME_KEY, 0, -1)
+            articles = [codec.loads(raw) for raw in (r.hmget(ARTICLES_KEY, ids) if ids else []) if raw]
+            _search_state["index"] = SearchIndex(articles)
+            _search_state["version"] = version
+            logging.info(f"Rebuilt search index over {len(articles)} stories (version {version})")
+        return _search_state["index"]
+
+
+def _filter_key(r, company=None, category=None):
+    """
+    Return the zset holding the ids that match the filters, newest scored highest.
+
+    A single filter maps straight onto its index; two filters are intersected
+    into a short-lived temporary key.
+    """
+    keys = []
+    if company:
+        keys.append(company_index(company))
+    if category:
+        keys.append(category_index(category))
+
+    if not keys:
+        return STORIES_BY_TIME_KEY
+    if len(keys) == 1:
+        return keys[0]
+
+    tmp_key = QUERY_TMP_PREFIX + hashlib.sha1("\0".join(keys).encode("utf-8")).hexdigest()
+    pipe = r.pipeline(transaction=True)
+    pipe.zinterstore(tmp_key, keys, aggregate="MAX")
+    pipe.expire(tmp_key, QUERY_TMP_TTL)
+    pipe.execute()
+    return tmp_key
+
+
+def query_articles(r, company=None, category=None, search="", offset=0, limit=None):
+    """
+    Return `(articles, total)` for one page of matching stories, newest first.
+
+    Each story is returned as its representative article (see `_fetch`) and
+    `total` counts stories. Company and category filters are resolved with the Redis indexes so only
+    the requested page of article records is fetched and decoded. A `search`
+    query goes through the inverted index and is ranked by relevance and
+    recency instead of publish time. Returns `(None, 0)` when nothing has
+    been scraped yet.
+    """
+    if not r.exists(ARTICLES_BY_TIME_KEY):
+        news = codec.load(r, LEGACY_NEWS_KEY)
+        if not news:
+            return None, 0
+        if company:
+            news = [n for n in news if n["company"] == company]
+        if category:
+            news = [n for n in news if n["category"] == category]
+        if search:
+            news = [n for n in news if search in n["title"].lower() or search in n["summary"].lower()]
+        end = None if limit is None else offset + limit
+        return news[offset:end], len(news)
+
+    key = _filter_key(r, company, category)
+
+    if search:
+        candidates = r.zrange(key, 0, -1) if key != STORIES_BY_TIME_KEY else None
+        end = None if limit is None else offset + limit
+        ids, total = get_search_index(r).search(search, candidates=candidates, limit=end)
+        return _fetch(r, ids[offset:end]), total
+
+    stop = -1 if limit is None else offset + limit - 1
+    pipe = r.pipeline(transaction=False)
+    pipe.zrevrange(key, offset, stop)
+    pipe.zcard(key)
+    ids, total = pipe.execute()
+    return _fetch(r, ids), total
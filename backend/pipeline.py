@@ -0,0 +1,133 @@
+import logging
+import queue
+import threading
+import time
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a pipeline run by `workers` threads.
+
+    `fn(item)` returns the item for the next stage, or None to drop it.
+    An `ordered` stage (always one worker) sees items in the order the
+    producer emitted them, whatever order earlier pools finished them in.
+    `close()` runs once after the stage's last item, e.g. to flush a batch.
+    """
+
+    def __init__(self, name, fn, workers=1, ordered=False, close=None):
+        self.name = name
+        self.fn = fn
+        self.workers = 1 if ordered else max(1, int(workers))
+        self.ordered = ordered
+        self.close = close
+
+
+def run_pipeline(job, produce, stages, maxsize=8, timer=None):
+    """
+    Stream items from `produce(emit)` through `stages` and wait for the end.
+
+    Stages are joined by queues of at most `maxsize` items, so `emit` blocks
+    while the slowest stage is behind and memory stays bounded however many
+    items are produced. Time spent per stage goes to `timer.record` (a
+    `PhaseTimer`); an exception in a stage is logged and counted in
+    `scraper_errors_total` and drops only that item. Returns the number of
+    items emitted.
+    """
+    queues = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+    emitted = [0]
+    emit_lock = threading.Lock()
+
+    def emit(item):
+        with emit_lock:
+            seq = emitted[0]
+            emitted[0] += 1
+        queues[0].put((seq, item))
+
+    def feed():
+        try:
+            produce(emit)
+        except Exception as e:
+            metrics.inc("scraper_errors_total", job=job, stage="produce")
+            logging.error(f"Pipeline '{job}' producer failed: {e}")
+        finally:
+            queues[0].put(_DONE)
+
+    def call(stage, item):
+        if item is None:
+            return None  # dropped earlier; passed on so ordered stages see every position
+        started = time.perf_counter()
+        try:
+            return stage.fn(item)
+        except Exception as e:
+            metrics.inc("scraper_errors_total", job=job, stage=stage.name)
+            logging.error(f"Pipeline '{job}' stage '{stage.name}' failed on {item}: {e}")
+            return None
+        finally:
+            if timer is not None:
+                timer.record(stage.name, time.perf_counter() - started)
+
+    def finish(stage, outbox):
+        if stage.close is not None:
+            try:
+                stage.close()
+            except Exception as e:
+                metrics.inc("scraper_errors_total", job=job, stage=stage.name)
+                logging.error(f"Pipeline '{job}' stage '{stage.name}' failed to close: {e}")
+        outbox.put(_DONE)
+
+    def work(stage, inbox, outbox, state):
+        while True:
+            message = inbox.get()
+            if message is _DONE:
+                inbox.put(_DONE)  # wake the stage's other workers
+                with state["lock"]:
+                    state["live"] -= 1
+                    last = state["live"] == 0
+                if last:
+                    finish(stage, outbox)
+                return
+            seq, item = message
+            outbox.put((seq, call(stage, item)))
+
+    def work_ordered(stage, inbox, outbox):
+        waiting = {}
+        next_seq = 0
+        while True:
+            message = inbox.get()
+            if message is _DONE:
+                for seq in sorted(waiting):  # only left over if the producer skipped a position
+                    outbox.put((seq, call(stage, waiting[seq])))
+                finish(stage, outbox)
+                return
+            seq, item = message
+            waiting[seq] = item
+            while next_seq in waiting:
+                outbox.put((next_seq, call(stage, waiting.pop(next_seq))))
+                next_seq += 1
+
+    threads = [threading.Thread(target=feed, name=f"{job}-produce", daemon=True)]
+    for stage, inbox, outbox in zip(stages, queues, queues[1:]):
+        if stage.ordered:
+            threads.append(threading.Thread(target=work_ordered, args=(stage, inbox, outbox),
+                                            name=f"{job}-{stage.name}", daemon=True))
+            continue
+        state = {"live": stage.workers, "lock": threading.Lock()}
+        threads.extend(
+            threading.Thread(target=work, args=(stage, inbox, outbox, state), name=f"{job}-{stage.name}-{i}", daemon=True)
+            for i in range(stage.workers)
+        )
+    for thread in threads:
+        thread.start()
+
+    # Drain the last queue so the final stage never blocks on it.
+    while queues[-1].get() is not _DONE:
+        pass
+    for thread in threads:
+        thread.join()
+    return emitted[0]
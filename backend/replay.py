@@ -0,0 +1,571 @@
+"""
+Offline record/replay harness for both scrapers and both APIs.
+
+    python replay.py record pharma                 # save live Google News feeds (network)
+    python replay.py record croma URL [--name tv]  # save a rendered Croma listing (network + Chrome)
+    python replay.py run                           # replay fixtures, no network
+    python replay.py run --update                  # accept current outputs and timings as expected
+
+`run` checks the pinned categorizer labels in fixtures/categories.json,
+serves fixtures/feeds/*.xml from a loopback HTTP server, runs
+scrape_pharma_news against it (cold and with the conditional-GET cache),
+extracts every fixtures/*.html Croma page with each parser backend, ingests
+both into Redis (fakeredis unless --redis-url is given) and calls the Flask
+endpoints through their test clients. It reports median latency,
+throughput and peak traced memory per stage, diffs every output against
+fixtures/expected/, and exits non-zero on a diff, a mislabelled category
+sample or a stage slower than --max-slowdown times its recorded baseline.
+"""
+import argparse
+import difflib
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+# The apps must not schedule live scrapes while the harness imports them.
+os.environ["PHARMA_REFRESH_INTERVAL"] = "0"
+os.environ["CROMA_REFRESH_INTERVAL"] = "0"
+
+import redis
+
+from categorizer import categorize_batch
+from croma_extract import BACKENDS, extract_page
+from croma_store import ingest_products, parse_price
+from feed_cache import FeedCache
+from pharma_scraper import COMPANIES, build_feed_url, scrape_pharma_news
+from pharma_store import ingest_articles
+from scraper import store_in_redis
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+FEED_DIR = os.path.join(FIXTURE_DIR, "feeds")
+EXPECTED_DIR = os.path.join(FIXTURE_DIR, "expected")
+TIMINGS_FILE = os.path.join(EXPECTED_DIR, "timings.json")
+CATEGORY_SAMPLES_FILE = os.path.join(FIXTURE_DIR, "categories.json")
+
+# Endpoint outputs whose order depends on the wall clock (recency ranking)
+# are compared as sets.
+UNORDERED_OUTPUTS = {"GET /news?search=approval"}
+
+CROMA_NOW = 1_800_000_000  # fixed ingest clock, so history timestamps are stable
+
+
+def feed_slug(company):
+    return re.sub(r"[^a-z0-9]+", "-", company.lower()).strip("-")
+
+
+def feed_query(company):
+    return build_feed_url(company, "{query}")
+
+
+# --- fixture server ----------------------------------------------------------
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """
+    Serves feed fixtures by Google News query, with ETag / Last-Modified.
+    Paths in `etag_only` get only an `Etag` header, cased as Google News
+    sends it, so revalidation must work from the ETag alone.
+    """
+
+    routes = {}  # request path -> fixture file
+    etag_only = set()
+    requests = 0
+    not_modified = 0
+    not_modified_etag_only = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        route = unquote(urlsplit(self.path).path)
+        path = self.routes.get(route)
+        if path is None:
+            self.send_error(404)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        etag_only = route in self.etag_only
+        last_modified = None if etag_only else formatdate(int(os.path.getmtime(path)), usegmt=True)
+        with self.lock:
+            FixtureHandler.requests += 1
+
+        unchanged = self.headers.get("If-None-Match") == etag
+        since = self.headers.get("If-Modified-Since")
+        if not unchanged and since and last_modified:
+            try:
+                unchanged = parsedate_to_datetime(since) >= parsedate_to_datetime(last_modified)
+            except (TypeError, ValueError):
+                pass
+        if unchanged:
+            with self.lock:
+                FixtureHandler.not_modified += 1
+                FixtureHandler.not_modified_etag_only += etag_only
+            self.send_response(304)
+            self.send_header("Etag" if etag_only else "ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/rss+xml; charset=utf-8" if path.endswith(".xml") else "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Etag" if etag_only else "ETag", etag)
+        if last_modified:
+            self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve_fixtures():
+    """Start the loopback fixture server; returns `(server, feed URL template)`."""
+    routes = {}
+    etag_only = set()
+    for position, company in enumerate(COMPANIES):
+        path = os.path.join(FEED_DIR, feed_slug(company) + ".xml")
+        if os.path.exists(path):
+            route = unquote(f"/{feed_query(company)}.xml")
+            routes[route] = path
+            if position % 2:
+                etag_only.add(route)
+    for path in glob.glob(os.path.join(FIXTURE_DIR, "*.html")):
+        routes["/croma/" + os.path.basename(path)] = path
+    FixtureHandler.routes = routes
+    FixtureHandler.etag_only = etag_only
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/{{query}}.xml"
+
+
+# --- measurement -------------------------------------------------------------
+
+class Stage:
+    def __init__(self, name, ms, peak_kb, items=None, unit="items", output=None):
+        self.name = name
+        self.ms = ms
+        self.peak_kb = peak_kb
+        self.items = items
+        self.unit = unit
+        self.output = output
+        self.diff = None
+        self.slowdown = None
+        self.failures = []  # self-check failures; fail the run even with --update
+
+    def throughput(self):
+        if not self.items or not self.ms:
+            return ""
+        return f"{self.items / (self.ms / 1000):,.0f} {self.unit}/s"
+
+
+def measure(name, fn, repeat, setup=None, items=None, unit="items"):
+    """Median wall time over `repeat` runs, then one traced run for peak memory."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+    count = items(result) if callable(items) else items
+    return Stage(name, statistics.median(timings), peak_kb, count, unit), result
+
+
+def canonical(output, unordered=False):
+    if unordered and isinstance(output, dict):
+        output = {key: sorted(value, key=lambda item: json.dumps(item, sort_keys=True)) if isinstance(value, list) else value
+                  for key, value in output.items()}
+    return json.dumps(output, indent=1, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def expected_path(stage_name):
+    return os.path.join(EXPECTED_DIR, re.sub(r"[^A-Za-z0-9]+", "_", stage_name).strip("_") + ".json")
+
+
+def compare(stage, unordered=False):
+    """Set `stage.diff` to the unified diff against the expected output (empty when equal)."""
+    actual = canonical(stage.output, unordered)
+    path = expected_path(stage.name)
+    if not os.path.exists(path):
+        stage.diff = None
+        return
+    with open(path, encoding="utf-8") as f:
+        expected = f.read()
+    stage.diff = list(difflib.unified_diff(
+        expected.splitlines(), actual.splitlines(), "expected", "actual", lineterm="", n=1,
+    ))
+
+
+# --- stages ------------------------------------------------------------------
+
+def pharma_stages(r, feed_template, repeat, rate):
+    stages = []
+    fetch = dict(rate=rate)
+    stage, articles = measure(
+        "pharma fetch+parse (cold)",
+        lambda: scrape_pharma_news(feed_url_template=feed_template, **fetch),
+        repeat, items=len(COMPANIES), unit="feeds",
+    )
+    stage.output = articles
+    stages.append(stage)
+
+    cache = FeedCache(r)
+    scrape_pharma_news(feed_url_template=feed_template, cache=cache, **fetch)  # prime validators
+    before = FixtureHandler.not_modified, FixtureHandler.not_modified_etag_only
+    stage, cached = measure(
+        "pharma fetch+parse (cached)",
+        lambda: scrape_pharma_news(feed_url_template=feed_template, cache=FeedCache(r), **fetch),
+        repeat, items=len(COMPANIES), unit="feeds",
+    )
+    stage.output = {
+        "articles_equal_cold": cached == articles,
+        "served_304": FixtureHandler.not_modified > before[0],
+        "served_304_etag_only": FixtureHandler.not_modified_etag_only > before[1],
+    }
+    stages.append(stage)
+
+    # Ingest at a fixed clock just after the newest fixture article.
+    now = max((a["timestamp"] for a in articles), default=0) + 3600
+    stage, stats = measure(
+        "pharma ingest",
+        lambda: ingest_articles(r, [dict(a) for a in articles], now=now),
+        repeat, setup=lambda: _clear(r, "pharma"), items=len(articles), unit="articles",
+    )
+    stage.output = stats
+    stages.append(stage)
+    return stages
+
+
+def categorizer_stage(repeat):
+    """Pinned headline -> category labels (fixtures/categories.json) must not drift."""
+    with open(CATEGORY_SAMPLES_FILE, encoding="utf-8") as f:
+        samples = json.load(f)
+    stage, labels = measure("categorize samples", lambda: categorize_batch(samples), repeat,
+                            items=len(samples), unit="articles")
+    stage.failures = [
+        f"{sample['title']!r}: expected {sample['category']}, got {label}"
+        for sample, label in zip(samples, labels) if label != sample["category"]
+    ]
+    stage.output = {"samples": len(samples), "mismatches": len(stage.failures)}
+    return [stage]
+
+
+def croma_stages(r, repeat):
+    stages = []
+    reference = "bs4"  # always installed, so expected outputs do not depend on extras
+    all_products = []
+    page_elements = None
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        name = os.path.basename(path)
+        outputs = {}
+        for backend in [reference] + [b for b in BACKENDS if b != reference]:
+            stage, (products, elements) = measure(
+                f"croma extract {name} [{backend}]",
+                lambda: extract_page(html, backend=backend),
+                repeat, items=lambda result: len(result[0]), unit="products",
+            )
+            outputs[backend] = products
+            # Only the reference backend's products are kept as expected
+            # output; the others must match it exactly.
+            stage.output = products if backend == reference else {f"matches_{reference}": products == outputs[reference]}
+            stages.append(stage)
+            if backend == reference:
+                page_elements = elements
+        all_products.extend(outputs[reference])
+
+    stage, stats = measure(
+        "croma ingest",
+        lambda: ingest_products(r, [dict(p) for p in all_products], now=CROMA_NOW),
+        repeat, setup=lambda: _clear(r, "croma"), items=len(all_products), unit="products",
+    )
+    stage.output = stats
+    stages.append(stage)
+
+    # A day later every third product is 10% cheaper, so price history and
+    # the drops feed have something to serve.
+    repriced = [dict(p) for p in all_products]
+    for product in repriced[::3]:
+        paise = parse_price(product.get("sale_price"))
+        if paise:
+            product["sale_price"] = f"₹{paise * 9 // 1000:,}"
+
+    def reset():
+        _clear(r, "croma")
+        ingest_products(r, [dict(p) for p in all_products], now=CROMA_NOW)
+
+    stage, stats = measure(
+        "croma re-ingest (repriced)",
+        lambda: ingest_products(r, [dict(p) for p in repriced], now=CROMA_NOW + 86400),
+        repeat, setup=reset, items=len(repriced), unit="products",
+    )
+    stage.output = stats
+    stages.append(stage)
+    if page_elements is not None:
+        store_in_redis(r, "croma_page_elements", page_elements)
+    return stages
+
+
+def browser_stage(fixture_base):
+    """
+    Full scrape_croma_data against the served fixtures in each extract mode
+    (needs Chrome). Both modes must return exactly what `extract_page`
+    parses from the fixture, and browser mode must not fall back to
+    page_source; either failure fails the run.
+    """
+    from scraper import scrape_croma_data
+    from timing import PhaseTimer
+
+    stages = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        name = os.path.basename(path)
+        with open(path, encoding="utf-8") as f:
+            expected, _ = extract_page(f.read())
+        for mode in ("html", "browser"):
+            timer = PhaseTimer()
+            stage, (products, _) = measure(
+                f"croma browser scrape {name} [{mode}]",
+                lambda: scrape_croma_data(f"{fixture_base}/croma/{name}", timer=timer, raise_errors=True, mode=mode),
+                1, items=lambda result: len(result[0]), unit="products",
+            )
+            if mode == "browser" and "page_source" in timer.phases:
+                stage.failures.append("in-browser extraction failed and fell back to page_source")
+            if products != expected:
+                mismatched = next((i for i, (got, want) in enumerate(zip(products, expected)) if got != want),
+                                  min(len(products), len(expected)))
+                stage.failures.append(f"{len(products)} products vs {len(expected)} from extract_page; "
+                                      f"first difference at #{mismatched}")
+            stage.output = {"matches_extract_page": products == expected}
+            stages.append(stage)
+    return stages
+
+
+def endpoint_stages(r, repeat):
+    import app as croma_app
+    import pharma_app
+
+    stages = []
+    for module in (croma_app, pharma_app):
+        module.r = r
+        module.response_cache.r = None  # measure the views, not the response cache
+
+    first_product = r.zrange("croma_catalog:order", 0, 0)
+    calls = [
+        (pharma_app.app, "/news"),
+        (pharma_app.app, "/news?company=Pfizer"),
+        (pharma_app.app, "/news?category=Earnings"),
+        (pharma_app.app, "/news?search=approval"),
+        (pharma_app.app, "/news?limit=20&offset=20"),
+        (croma_app.app, "/products"),
+        (croma_app.app, "/products?limit=20&sort=price"),
+        (croma_app.app, "/products?search=oled&fields=title,sale_price"),
+        (croma_app.app, "/price-drops"),
+        (croma_app.app, "/scraped-content"),
+    ]
+    if first_product:
+        calls.append((croma_app.app, f"/products/{first_product[0]}/history"))
+
+    for flask_app, url in calls:
+        client = flask_app.test_client()
+        stage, response = measure(f"GET {url}", lambda: client.get(url), repeat, items=1, unit="requests")
+        stage.output = {"status": response.status_code, "body": response.get_json()}
+        stage.bytes = len(response.get_data())
+        stages.append(stage)
+    return stages
+
+
+def _clear(r, namespace):
+    """Drop the keys a stage writes so every timed run starts from an empty store."""
+    patterns = {
+        "pharma": ["pharma_*", "cache_version:pharma", "events:pharma"],
+        "croma": ["croma_*", "cache_version:croma", "events:croma"],
+    }[namespace]
+    keys = [key for pattern in patterns for key in r.scan_iter(match=pattern)]
+    if keys:
+        r.delete(*keys)
+
+
+# --- commands ----------------------------------------------------------------
+
+def connect(redis_url):
+    if redis_url:
+        r = redis.Redis.from_url(redis_url, decode_responses=True)
+        r.ping()
+        return r
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is not installed; install it or pass --redis-url redis://localhost:6379/15")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def run(args):
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    r = connect(args.redis_url)
+    r.flushdb()
+    server, feed_template = serve_fixtures()
+    fixture_base = feed_template.rsplit("/", 1)[0]
+
+    stages = categorizer_stage(args.repeat)
+    stages += pharma_stages(r, feed_template, args.repeat, args.rate)
+    stages += croma_stages(r, args.repeat)
+    if args.browser:
+        stages += browser_stage(fixture_base)
+    stages += endpoint_stages(r, args.repeat)
+    server.shutdown()
+
+    baseline = {}
+    if os.path.exists(TIMINGS_FILE):
+        with open(TIMINGS_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+    for stage in stages:
+        compare(stage, unordered=stage.name in UNORDERED_OUTPUTS)
+        if stage.name in baseline and baseline[stage.name] > 0:
+            stage.slowdown = stage.ms / baseline[stage.name]
+
+    report(stages, args)
+    failed = [stage for stage in stages if stage.failures]
+    for stage in failed:
+        print(f"\n--- {stage.name} self-check failed")
+        print("\n".join(stage.failures))
+
+    if args.update and failed:
+        print("\nNot updating expected outputs while a self-check fails.")
+        return 1
+    if args.update:
+        os.makedirs(EXPECTED_DIR, exist_ok=True)
+        for stage in stages:
+            with open(expected_path(stage.name), "w", encoding="utf-8") as f:
+                f.write(canonical(stage.output, stage.name in UNORDERED_OUTPUTS) + "\n")
+        with open(TIMINGS_FILE, "w", encoding="utf-8") as f:
+            json.dump({stage.name: round(stage.ms, 3) for stage in stages}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        print(f"\nExpected outputs and timings written to {EXPECTED_DIR}")
+        return 0
+
+    diffs = [stage for stage in stages if stage.diff]
+    slow = [stage for stage in stages if stage.slowdown and stage.slowdown > args.max_slowdown]
+    return 1 if diffs or slow or failed else 0
+
+
+def report(stages, args):
+    print(f"{'stage':<58}{'ms':>9}{'vs base':>9}{'peak KB':>10}  {'throughput':<22}output")
+    for stage in stages:
+        vs = f"{stage.slowdown:.2f}x" if stage.slowdown else "-"
+        if stage.diff is None:
+            status = "new (no expected output)"
+        elif stage.diff:
+            status = f"DIFF ({sum(1 for line in stage.diff if line[:1] in '+-') - 2} lines)"
+        else:
+            status = "ok"
+        if stage.failures:
+            status += f", {len(stage.failures)} self-check failures"
+        if stage.slowdown and stage.slowdown > args.max_slowdown:
+            status += f", SLOWER than {args.max_slowdown}x baseline"
+        print(f"{stage.name[:57]:<58}{stage.ms:>9.2f}{vs:>9}{stage.peak_kb:>10.0f}  {stage.throughput():<22}{status}")
+
+    if args.show_diff:
+        for stage in stages:
+            if stage.diff:
+                print(f"\n--- {stage.name}")
+                print("\n".join(stage.diff[:args.show_diff]))
+
+    if args.json:
+        summary = [{
+            "stage": stage.name,
+            "ms": round(stage.ms, 3),
+            "baseline_ratio": round(stage.slowdown, 3) if stage.slowdown else None,
+            "peak_kb": round(stage.peak_kb, 1),
+            "items": stage.items,
+            "unit": stage.unit,
+            "diff_lines": len(stage.diff) if stage.diff else 0,
+        } for stage in stages]
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=1)
+
+
+def record(args):
+    if args.target == "pharma":
+        from feed_fetcher import fetch_all
+
+        os.makedirs(FEED_DIR, exist_ok=True)
+        urls = [build_feed_url(company) for company in COMPANIES]
+        for company, result in zip(COMPANIES, fetch_all(urls)):
+            if not result.ok:
+                logging.error(f"Could not record {company}: {result.error or result.status}")
+                continue
+            with open(os.path.join(FEED_DIR, feed_slug(company) + ".xml"), "wb") as f:
+                f.write(result.body)
+            logging.info(f"Recorded {company} ({len(result.body) / 1024:.0f} KB)")
+        return 0
+
+    from scraper import scrape_croma_data
+
+    if not args.url:
+        sys.exit("record croma needs a listing URL")
+    name = args.name or urlsplit(args.url).path.strip("/").split("/")[0] or "listing"
+    path = os.path.join(FIXTURE_DIR, f"croma_{feed_slug(name)}.html")
+
+    def save(html):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        logging.info(f"Recorded {args.url} -> {path} ({len(html) / 1024:.0f} KB)")
+
+    scrape_croma_data(args.url, raise_errors=True, record_html=save)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="save live feeds or a rendered Croma page as fixtures")
+    rec.add_argument("target", choices=["pharma", "croma"])
+    rec.add_argument("url", nargs="?", help="Croma listing URL (croma only)")
+    rec.add_argument("--name", help="fixture name for a Croma page")
+    rec.set_defaults(func=record)
+
+    replay = sub.add_parser("run", help="replay fixtures offline and report latency, memory and diffs")
+    replay.add_argument("--redis-url", help="use this Redis database (it is flushed) instead of fakeredis")
+    replay.add_argument("--repeat", type=int, default=5, help="timed runs per stage (median reported)")
+    replay.add_argument("--rate", type=float, default=0, help="feed requests per second (0: unpaced; production uses 8)")
+    replay.add_argument("--max-slowdown", type=float, default=3.0, help="fail when a stage is this much slower than its baseline")
+    replay.add_argument("--browser", action="store_true", help="also run scrape_croma_data on the served fixtures (needs Chrome)")
+    replay.add_argument("--update", action="store_true", help="write current outputs and timings as the expected ones")
+    replay.add_argument("--show-diff", type=int, nargs="?", const=40, default=0, metavar="LINES", help="print output diffs")
+    replay.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    replay.add_argument("--verbose", action="store_true", help="keep INFO logging from the scrapers")
+    replay.set_defaults(func=run)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
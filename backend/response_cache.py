@@ -0,0 +1,130 @@
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, make_response, request
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+VERSION_KEY_PREFIX = "cache_version:"
+INVALIDATE_CHANNEL_PREFIX = "cache_invalidate:"
+
+
+def bump_version(redis_client, namespace):
+    """
+    Invalidate every cached response of `namespace` (e.g. "croma", "pharma").
+
+    Scrapers call this after writing new data: the counter makes the change
+    visible to every API process, the pub/sub message makes it immediate.
+    """
+    version = redis_client.incr(VERSION_KEY_PREFIX + namespace)
+    redis_client.publish(INVALIDATE_CHANNEL_PREFIX + namespace, version)
+    return version
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized Flask responses.
+
+    Entries are keyed by path and query string and tagged with the data
+    version they were rendered from. The version is pushed over Redis
+    pub/sub and re-read from the Redis counter at most every
+    `check_interval` seconds, so a missed message only delays invalidation.
+    """
+
+    def __init__(self, redis_client, namespace, max_entries=256, check_interval=5.0):
+        self.r = redis_client
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        if self.r is not None:
+            threading.Thread(target=self._listen, name=f"cache-invalidate-{namespace}", daemon=True).start()
+
+    def _listen(self):
+        channel = INVALIDATE_CHANNEL_PREFIX + self.namespace
+        while True:
+            try:
+                pubsub = self.r.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(channel)
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._set_version(str(message["data"]))
+            except Exception as e:
+                logging.warning(f"Cache invalidation listener for '{self.namespace}' restarting: {e}")
+                time.sleep(self.check_interval)
+
+    def _set_version(self, version):
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries.clear()
+            self._checked_at = time.monotonic()
+
+    def current_version(self):
+        if self.r is None:
+            return None
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            try:
+                self._set_version(self.r.get(VERSION_KEY_PREFIX + self.namespace) or "0")
+            except Exception as e:
+                logging.warning(f"Could not read cache version for '{self.namespace}': {e}")
+        return self._version
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                metrics.inc("api_response_cache_total", namespace=self.namespace, result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.inc("api_response_cache_total", namespace=self.namespace, result="hit")
+        return entry
+
+    def put(self, key, version, body, mimetype, etag):
+        with self._lock:
+            self._entries[key] = (version, body, mimetype, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, view):
+        """
+        Decorator serving a view's 200 responses from the cache.
+
+        Responses carry an ETag, so clients revalidating with If-None-Match
+        get a bodyless 304.
+        """
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            version = self.current_version()
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+
+            entry = self.get(key, version) if version is not None else None
+            if entry is not None:
+                _, body, mimetype, etag = entry
+                response = Response(body, mimetype=mimetype)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or version is None:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()
+                self.put(key, version, body, response.mimetype, etag)
+
+            response.set_etag(etag)
+            return response.make_conditional(request)
+
+        return wrapper
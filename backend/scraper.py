@@ -1,272 +1,257 @@
+import os
 import time
 import redis
-import json
 import logging
-from bs4 import BeautifulSoup
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.action_chains import ActionChains
-from webdriver_manager.chrome import ChromeDriverManager
+
+import codec
+import metrics
+from croma_extract import extract_in_browser, extract_page
+from croma_store import ingest_products
+from driver_pool import get_default_pool
+from response_cache import bump_version
+from timing import PhaseTimer
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def scrape_croma_data(url):
+LAZY_LOAD_DEADLINE = 45   # seconds before we give up waiting and take what loaded
+LAZY_LOAD_QUIET = 1.5     # seconds without DOM changes or image loads that count as settled
+SCROLL_STEP_DELAY = 0.05  # seconds between viewport-sized scroll steps
+
+# "browser" extracts products with one execute_script call; "html" ships
+# driver.page_source to Python and parses it with croma_extract. Browser
+# mode falls back to html mode if the script fails. html stays the default
+# until `replay.py run --browser` has shown both modes agree on the fixtures.
+EXTRACT_MODE = os.environ.get("CROMA_EXTRACT_MODE", "html")
+
+CROMA_URL = "https://www.croma.com/televisions-accessories/c/997"
+
+# Scrolls the page one viewport at a time to trip the lazy loader, copies
+# data-src / data-lazy-src onto placeholder images, then resolves as soon as
+# every product image has a real src, or the page has gone quiet (no
+# mutations or image loads) for quietMs, or the deadline passes.
+LAZY_LOAD_JS = """
+var done = arguments[arguments.length - 1];
+var deadlineMs = arguments[0], quietMs = arguments[1], stepMs = arguments[2];
+var started = Date.now(), deadline = started + deadlineMs, lastChange = started, scrolledAt = 0;
+
+var observer = new MutationObserver(function () { lastChange = Date.now(); });
+observer.observe(document.body, {
+    childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'srcset', 'data-src']
+});
+function onLoad(e) { if (e.target && e.target.tagName === 'IMG') { lastChange = Date.now(); } }
+document.addEventListener('load', onLoad, true);
+
+function isPlaceholder(src) { return !src || src.indexOf('lazyLoading.gif') !== -1; }
+
+function forceSources() {
+    document.querySelectorAll('img[data-src], img[data-lazy-src]').forEach(function (img) {
+        var lazy = img.dataset.src || img.dataset.lazySrc;
+        if (lazy && isPlaceholder(img.getAttribute('src'))) { img.src = lazy; }
+    });
+}
+
+function status() {
+    var imgs = document.querySelectorAll('li.product-item img'), pending = 0;
+    imgs.forEach(function (img) { if (isPlaceholder(img.getAttribute('src'))) { pending++; } });
+    return {total: imgs.length, pending: pending};
+}
+
+function finish(reason) {
+    observer.disconnect();
+    document.removeEventListener('load', onLoad, true);
+    var s = status(), now = Date.now();
+    s.reason = reason;
+    s.scroll_ms = scrolledAt - started;
+    s.settle_ms = now - scrolledAt;
+    done(s);
+}
+
+function settle() {
+    forceSources();
+    var now = Date.now();
+    if (status().pending === 0) { return finish('images'); }
+    if (now - lastChange >= quietMs) { return finish('quiet'); }
+    if (now >= deadline) { return finish('deadline'); }
+    setTimeout(settle, 100);
+}
+
+var position = 0;
+function step() {
+    var height = document.body.scrollHeight;
+    window.scrollTo(0, position);
+    window.dispatchEvent(new Event('scroll'));
+    if (position < height && Date.now() < deadline) {
+        position += Math.max(window.innerHeight - 100, 300);
+        setTimeout(step, stepMs);
+    } else {
+        scrolledAt = Date.now();
+        settle();
+    }
+}
+step();
+"""
+
+def _loaded_without_products(driver):
+    """True when the page finished loading and simply lists no products."""
+    try:
+        return driver.execute_script(
+            "return document.readyState === 'complete' && !document.querySelector('.product-item')"
+        )
+    except Exception:
+        return False
+
+
+def scrape_croma_data(url, pool=None, timer=None, raise_errors=False, mode=None, record_html=None,
+                      allow_empty=False):
     """
     Enhanced scraper with better lazy loading handling for Croma website.
+
+    Browser sessions come from `pool` (default: the process-wide
+    `driver_pool` pool), so repeated scrapes skip Chrome start-up. Time
+    spent per phase is recorded in `timer` (default: a `timing.PhaseTimer`
+    reporting to `metrics` as job "croma") and logged at the end. Errors
+    are logged and give empty results unless `raise_errors` is set, which
+    lets callers such as the crawler retry.
+    With `allow_empty`, a page that loads but has no product items (e.g.
+    past the end of a listing) returns no products instead of timing out,
+    and its browser session goes back to the pool.
+    `mode` overrides EXTRACT_MODE. `record_html`, if given, is called with
+    the rendered page source (e.g. to save a fixture); it implies html mode.
     """
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--window-size=1920,1080")
-    options.add_argument("--disable-blink-features=AutomationControlled")
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])
-    options.add_experimental_option('useAutomationExtension', False)
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36")
-    
-    service = Service(ChromeDriverManager().install())
-    driver = None
-    
+    pool = pool or get_default_pool()
+    mode = "html" if record_html else mode or EXTRACT_MODE
+    timer = timer or PhaseTimer("croma")
+
     try:
-        logging.info("Initializing Selenium WebDriver...")
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
-        logging.info(f"Requesting page with Selenium: {url}")
-        driver.get(url)
-
-        logging.info("Waiting for initial product items to be visible...")
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "product-item"))
-        )
-        
-        time.sleep(3)
-        
-        logging.info("Starting enhanced scrolling to trigger lazy loading...")
-        
-        total_height = driver.execute_script("return document.body.scrollHeight")
-        current_position = 0
-        scroll_increment = 300 
-        
-        while current_position < total_height:
-            driver.execute_script(f"window.scrollTo(0, {current_position});")
-            time.sleep(0.5)  
-            current_position += scroll_increment
-            
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height > total_height:
-                total_height = new_height
-        
-        # Method 2: Scroll to each product individually
-        logging.info("Scrolling to individual products to ensure image loading...")
-        try:
-            product_items = driver.find_elements(By.CLASS_NAME, "product-item")
-            logging.info(f"Found {len(product_items)} products to scroll through")
-            
-            for i, item in enumerate(product_items):
+        logging.info("Acquiring a WebDriver session from the pool...")
+        acquire_started = time.perf_counter()
+        with pool.session() as driver:
+            timer.record("driver_acquire", time.perf_counter() - acquire_started)
+
+            with timer.phase("page_load"):
+                logging.info(f"Requesting page with Selenium: {url}")
+                driver.get(url)
+
+                logging.info("Waiting for initial product items to be visible...")
                 try:
-                    # Scroll to the product
-                    driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", item)
-                    time.sleep(0.8)  # Wait for image to load
-                    
-                    # Additional trigger for lazy loading
-                    ActionChains(driver).move_to_element(item).perform()
-                    time.sleep(0.3)
-                    
-                    if i % 5 == 0:
-                        logging.info(f"Processed {i+1}/{len(product_items)} products")
-                        
+                    WebDriverWait(driver, 30).until(
+                        EC.presence_of_element_located((By.CLASS_NAME, "product-item"))
+                    )
+                except TimeoutException:
+                    if not (allow_empty and _loaded_without_products(driver)):
+                        raise
+                    logging.info("Page loaded without product items; treating it as an empty listing.")
+                    return [], {"head": None, "header": None}
+
+            with timer.phase("lazy_load"):
+                logging.info("Scrolling and waiting for lazy-loaded product images...")
+                driver.set_script_timeout(LAZY_LOAD_DEADLINE + 10)
+                outcome = driver.execute_async_script(
+                    LAZY_LOAD_JS, LAZY_LOAD_DEADLINE * 1000, LAZY_LOAD_QUIET * 1000, SCROLL_STEP_DELAY * 1000
+                )
+                # Sub-phases of lazy_load, kept out of the timer so its total stays exact.
+                metrics.record_stage("croma", "lazy_load_scroll", outcome["scroll_ms"] / 1000)
+                metrics.record_stage("croma", "lazy_load_settle", outcome["settle_ms"] / 1000)
+                logging.info(
+                    f"Lazy loading finished ({outcome['reason']}): {outcome['total'] - outcome['pending']}/"
+                    f"{outcome['total']} product images resolved, scroll {outcome['scroll_ms']} ms, "
+                    f"settle {outcome['settle_ms']} ms"
+                )
+
+            products = html_content = None
+            if mode == "browser":
+                try:
+                    with timer.phase("browser_extract"):
+                        products, page_elements = extract_in_browser(driver)
                 except Exception as e:
-                    logging.debug(f"Error scrolling to product {i}: {e}")
-                    continue
-        except Exception as e:
-            logging.error(f"Error during individual product scrolling: {e}")
-        
-        # Method 3: Force trigger lazy loading with JavaScript
-        logging.info("Force triggering lazy loading with JavaScript...")
-        driver.execute_script("""
-            // Trigger intersection observer for all images
-            var images = document.querySelectorAll('img[data-src], img[loading="lazy"], img[data-lazy-src]');
-            images.forEach(function(img, index) {
-                // Scroll into view
-                img.scrollIntoView({behavior: 'auto', block: 'center'});
-                
-                // Trigger various lazy loading events
-                var events = ['scroll', 'resize', 'orientationchange', 'touchstart', 'touchmove'];
-                events.forEach(function(eventType) {
-                    var event = new Event(eventType);
-                    window.dispatchEvent(event);
-                });
-                
-                // Force load data-src images
-                if (img.dataset.src && !img.src.includes('lazyLoading.gif')) {
-                    img.src = img.dataset.src;
-                }
-                if (img.dataset.lazySrc && !img.src.includes('lazyLoading.gif')) {
-                    img.src = img.dataset.lazySrc;
-                }
-            });
-        """)
-        
-        # Wait for images to load after JavaScript execution
-        time.sleep(5)
-        
-        # Final comprehensive scroll
-        logging.info("Performing final comprehensive scroll...")
-        driver.execute_script("window.scrollTo(0, 0);")
-        time.sleep(1)
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(3)
-        
-        # Wait for any remaining images to load
-        logging.info("Waiting for final image loads...")
-        WebDriverWait(driver, 10).until(
-            lambda d: len(d.find_elements(By.XPATH, "//img[contains(@src, 'lazyLoading.gif')]")) < 5
-        )
-        
-        # Get final HTML
-        logging.info("Getting final page source after all scrolling.")
-        html_content = driver.page_source
-        soup = BeautifulSoup(html_content, 'html.parser')
-
-        # Enhanced Product Scraping
-        products = []
-        product_list_items = soup.find_all('li', class_='product-item')
-        
-        if product_list_items:
-            logging.info(f"Found {len(product_list_items)} product items for scraping.")
-            
-            for i, item in enumerate(product_list_items):
-                product = {}
-                
-                # Extract title
-                title_element = item.find('h3', class_='product-title')
-                product['title'] = title_element.text.strip() if title_element else 'N/A'
-                
-                # Extract prices
-                prices = item.find_all('span', class_='amount')
-                if len(prices) > 1:
-                    product['sale_price'] = prices[0].text.strip()
-                    product['price'] = prices[1].text.strip()
-                elif prices:
-                    product['sale_price'] = prices[0].text.strip()
-                    product['price'] = ''
-                else:
-                    product['sale_price'] = 'N/A'
-                    product['price'] = 'N/A'
-
-                # Enhanced image extraction
-                product['image_url'] = ''
-                img_tags = item.find_all('img')
-
-                # Priority order for image attributes
-                image_attrs = ['src', 'data-src', 'data-lazy-src', 'data-original', 'data-srcset']
-                
-                for img in img_tags:
-                    for attr in image_attrs:
-                        image_url = img.get(attr)
-                        if image_url and not image_url.endswith('lazyLoading.gif'):
-                            if image_url.startswith('http') or image_url.startswith('//'):
-                                product['image_url'] = image_url
-                                break
-                    if product['image_url']:
-                        break
-
-                # Fallback selectors if no image found
-                if not product['image_url']:
-                    selectors = [
-                        'img.product-img', 
-                        '.product-image img', 
-                        'figure img', 
-                        'a img',
-                        '.product-img-wrapper img',
-                        '.image-container img'
-                    ]
-                    
-                    for selector in selectors:
-                        img_element = item.select_one(selector)
-                        if img_element:
-                            for attr in image_attrs:
-                                image_url = img_element.get(attr)
-                                if image_url and not image_url.endswith('lazyLoading.gif'):
-                                    if image_url.startswith('http') or image_url.startswith('//'):
-                                        product['image_url'] = image_url
-                                        break
-                        if product['image_url']:
-                            break
-
-                # Final fallback
-                if not product['image_url'] or product['image_url'].endswith('lazyLoading.gif'):
-                    product['image_url'] = 'https://via.placeholder.com/400x400?text=No+Image'
-                    logging.warning(f"No valid image found for product {i+1}: {product['title']}")
-                
-                products.append(product)
-                
-                # Log progress every 5 products
-                if (i + 1) % 5 == 0:
-                    logging.info(f"Scraped {i+1}/{len(product_list_items)} products")
+                    metrics.inc("scraper_errors_total", job="croma", stage="browser_extract")
+                    logging.warning(f"In-browser extraction failed, falling back to page_source: {e}")
+
+            if products is None:
+                # Get final HTML
+                with timer.phase("page_source"):
+                    logging.info("Getting final page source after all scrolling.")
+                    html_content = driver.page_source
+                if record_html:
+                    record_html(html_content)
+
+        # The browser goes back to the pool before the CPU-bound parse.
+        if html_content is not None:
+            with timer.phase("extract"):
+                products, page_elements = extract_page(html_content)
+        metrics.inc("scraper_items_total", len(products), job="croma", kind="products")
+        if products:
+            logging.info(f"Extracted {len(products)} product items.")
         else:
             logging.warning("No product items found.")
 
-        # Page Elements
-        head_element = soup.find('head')
-        header_element = soup.find('header', id='header')
-        
-        page_elements = {
-            "head": str(head_element) if head_element else None,
-            "header": str(header_element) if header_element else None,
-        }
-        
         # Log final statistics
         valid_images = sum(1 for p in products if p['image_url'] and not p['image_url'].endswith('placeholder'))
         logging.info(f"Scraping completed: {len(products)} products, {valid_images} with valid images")
-        
+
         return products, page_elements
 
     except Exception as e:
+        metrics.inc("scraper_errors_total", job="croma", stage="scrape")
         logging.error(f"Error during scraping: {e}")
+        if raise_errors:
+            raise
         return [], {"head": None, "header": None}
     finally:
-        if driver:
-            driver.quit()
+        timer.log("Croma scrape phases")
 
 def store_in_redis(redis_client, key, data):
-    """Generic function to store data in Redis."""
+    """Generic function to store data in Redis (encoded by `codec`)."""
     try:
-        redis_client.set(key, json.dumps(data))
-        logging.info(f"Data successfully stored in Redis with key '{key}'.")
+        with metrics.span("croma", "redis_write"):
+            size = codec.store(redis_client, key, data)
+        logging.info(f"Data successfully stored in Redis with key '{key}' ({size / 1024:.1f} KB).")
     except Exception as e:
+        metrics.inc("scraper_errors_total", job="croma", stage="redis_write")
         logging.error(f"Failed to store data for key '{key}': {e}")
 
-if __name__ == "__main__":
-    croma_url = "https://www.croma.com/televisions-accessories/c/997"
-    product_data, page_element_data = scrape_croma_data(croma_url)
-    
-    try:
-        r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        r.ping()
-        
+def refresh(r, url=None):
+    """Scrape one Croma listing and merge it into Redis; returns the catalog stats."""
+    with metrics.run_summary("croma") as run:
+        product_data, page_element_data = scrape_croma_data(url or CROMA_URL, raise_errors=True)
+        stats = {"scraped": len(product_data)}
+
         if product_data:
-            store_in_redis(r, "croma_products", product_data)
-            
+            with metrics.span("croma", "redis_write"):
+                stats.update(ingest_products(r, product_data, sources={f"listing:{url or CROMA_URL}": None}))
+            logging.info(
+                f"Catalog: {stats['added']} added, {stats['updated']} updated, {stats['unchanged']} unchanged, "
+                f"{stats['price_changes']} price changes ({stats['price_drops']} drops), {stats['removed']} removed"
+            )
+
             # Log image statistics
             valid_images = sum(1 for p in product_data if p['image_url'] and not p['image_url'].endswith('placeholder'))
             logging.info(f"Final results: {len(product_data)} products, {valid_images} with valid images")
         else:
             logging.warning("No product data was scraped.")
-            
+
         if page_element_data.get("head") or page_element_data.get("header"):
             store_in_redis(r, "croma_page_elements", page_element_data)
         else:
             logging.warning("No head/header data was scraped.")
 
+        bump_version(r, "croma")
+        run.result = stats
+        return stats
+
+if __name__ == "__main__":
+    try:
+        r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        r.ping()
+        refresh(r)
     except redis.ConnectionError:
         logging.error("Could not connect to Redis. Is the server running?")
-        
-    logging.info("Scraping script finished.")
\ No newline at end of file
+    except Exception as e:
+        logging.error(f"Scrape failed: {e}")
+
+    logging.info("Scraping script finished.")
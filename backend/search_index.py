@@ -0,0 +1,119 @@
+import heapq
+import math
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+TITLE_WEIGHT = 2.0
+SUMMARY_WEIGHT = 1.0
+# Relevance is multiplied by (1 + RECENCY_WEIGHT * 0.5 ** (age / half-life)).
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE = 3 * 86400
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Token-level inverted index over article titles and summaries.
+
+    Postings map each token to `{article id: weighted term frequency}`. The
+    sorted vocabulary lets every query term match as a prefix, so "pfiz"
+    finds "pfizer". Multi-term queries are ANDed and ranked by TF-IDF
+    relevance boosted by recency.
+    """
+
+    def __init__(self, articles=()):
+        self.postings = defaultdict(dict)
+        self.timestamps = {}
+        self.vocabulary = []
+        self.build(articles)
+
+    def build(self, articles):
+        postings = defaultdict(dict)
+        timestamps = {}
+        for article in articles:
+            article_key = article["id"]
+            timestamps[article_key] = article.get("timestamp", 0)
+            for weight, field in ((TITLE_WEIGHT, "title"), (SUMMARY_WEIGHT, "summary")):
+                for token in tokenize(article.get(field, "")):
+                    posting = postings[token]
+                    posting[article_key] = posting.get(article_key, 0.0) + weight
+        self.postings = postings
+        self.timestamps = timestamps
+        self.vocabulary = sorted(postings)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def _expand(self, term):
+        """All vocabulary tokens starting with `term`."""
+        start = bisect_left(self.vocabulary, term)
+        tokens = []
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _term_postings(self, term):
+        """Postings of every token `term` is a prefix of, with their IDF."""
+        total = len(self.timestamps) or 1
+        postings = []
+        for token in self._expand(term):
+            posting = self.postings[token]
+            postings.append((posting, math.log(1 + total / len(posting))))
+        return postings
+
+    def search(self, query, candidates=None, now=None, limit=None):
+        """
+        Return `(ids, total)`: article ids matching every term of `query`,
+        best first, and the number of matches.
+
+        `candidates`, when given, restricts the result to those ids (e.g. the
+        output of a company/category filter). With `limit` only the top
+        `limit` ids are ranked and returned.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+
+        per_term = [self._term_postings(term) for term in terms]
+        if not all(per_term):
+            return [], 0
+
+        # Intersect id sets smallest first, then score only the survivors.
+        per_term.sort(key=lambda postings: sum(len(posting) for posting, _ in postings))
+        matched = None
+        for postings in per_term:
+            ids = set()
+            for posting, _ in postings:
+                ids.update(posting)
+            matched = ids if matched is None else matched & ids
+            if candidates is not None and matched is ids:
+                matched &= set(candidates)
+            if not matched:
+                return [], 0
+
+        now = time.time() if now is None else now
+        ranked = []
+        for article_key in matched:
+            relevance = 0.0
+            for postings in per_term:
+                for posting, idf in postings:
+                    relevance += posting.get(article_key, 0.0) * idf
+            timestamp = self.timestamps.get(article_key, 0)
+            age = max(0.0, now - timestamp)
+            boost = 1 + RECENCY_WEIGHT * 0.5 ** (age / RECENCY_HALF_LIFE)
+            ranked.append((relevance * boost, timestamp, article_key))
+
+        if limit is None:
+            ranked.sort(reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, ranked)
+        return [article_key for _, _, article_key in ranked], len(matched)
@@ -0,0 +1,210 @@
+"""
+Registry of pharma news sources.
+
+    python sources.py list                            # merged registry and schedule state
+    python sources.py set "Moderna" color=#D52B1E     # add or override a source in Redis
+    python sources.py set Pfizer interval=3600 priority=2
+    python sources.py unset Pfizer                    # drop the Redis override
+
+Each source is one tracked company: its feed query, an optional feed URL
+template, the per-run article cap, the minimum seconds between fetches and
+a scheduling priority. Sources come from sources.json (or the file named by
+PHARMA_SOURCES_FILE); the Redis hash `pharma_sources` overrides fields per
+name and adds sources without a redeploy.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, fields
+from urllib.parse import quote_plus
+
+import redis
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+SOURCES_FILE = os.environ.get(
+    "PHARMA_SOURCES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sources.json")
+)
+SOURCES_KEY = "pharma_sources"            # hash: name -> JSON fields overriding or adding to the file
+SOURCE_STATE_KEY = "pharma_source_state"  # hash: name -> JSON {last_run, activity, articles}
+
+DEFAULT_COLOR = "#333333"
+ACTIVITY_DECAY = 0.5  # weight of the previous value in each source's moving average of new articles
+SCHEDULE_SLACK = 60   # seconds; a source is due this early so job timing jitter does not skip a period
+
+
+@dataclass
+class Source:
+    name: str
+    color: str = DEFAULT_COLOR
+    query: str = "{name} pharmaceutical drug"
+    url_template: str = ""   # empty: the scraper's feed URL template
+    max_articles: int = 6    # articles taken per run, not counting near-duplicates
+    interval: int = 0        # minimum seconds between fetches; 0: every run
+    priority: int = 0        # higher is fetched (and claims shared links) first
+    enabled: bool = True
+
+    def feed_query(self):
+        return quote_plus(self.query.format(name=self.name))
+
+    def feed_url(self, default_template):
+        return (self.url_template or default_template).format(query=self.feed_query())
+
+
+FIELD_TYPES = {field.name: field.type for field in fields(Source)}
+
+
+def make_source(name, values):
+    """A `Source` from raw field values; raises ValueError for an invalid one."""
+    kwargs = {}
+    for key, value in values.items():
+        if key == "name":
+            continue
+        kind = FIELD_TYPES.get(key)
+        if kind is None:
+            logging.warning(f"Ignoring unknown field '{key}' of pharma source '{name}'")
+        elif kind is bool and not isinstance(value, bool):
+            kwargs[key] = str(value).lower() in ("1", "true", "yes")
+        else:
+            kwargs[key] = kind(value)
+    source = Source(name=name, **kwargs)
+    if not name or source.max_articles < 1 or source.interval < 0:
+        raise ValueError("needs a name, max_articles >= 1 and interval >= 0")
+    return source
+
+
+def _read_file(path):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    defaults = data.get("defaults", {})
+    return defaults, {entry["name"]: {**defaults, **entry} for entry in data.get("sources", [])}
+
+
+def load_sources(r=None, path=None, include_disabled=False):
+    """
+    The registry in file order, with the Redis overrides applied and
+    Redis-only sources appended by name. Invalid entries are logged and
+    skipped; without Redis (or when it fails) the file alone is used.
+    """
+    defaults, entries = _read_file(path or SOURCES_FILE)
+    overrides = {}
+    if r is not None:
+        try:
+            overrides = r.hgetall(SOURCES_KEY)
+        except redis.RedisError as e:
+            logging.error(f"Could not read the source overrides from Redis: {e}")
+    for name in sorted(overrides):
+        try:
+            entries[name] = {**entries.get(name, defaults), **json.loads(overrides[name])}
+        except (json.JSONDecodeError, TypeError):
+            logging.warning(f"Ignoring corrupt source override for '{name}'")
+
+    sources = []
+    for name, values in entries.items():
+        try:
+            source = make_source(name, values)
+        except (TypeError, ValueError) as e:
+            logging.error(f"Ignoring pharma source '{name}': {e}")
+            continue
+        if source.enabled or include_disabled:
+            sources.append(source)
+    return sources
+
+
+def load_state(r, sources):
+    """`{name: {"last_run", "activity", "articles"}}` for `sources` (empty dicts for new ones)."""
+    names = [source.name for source in sources]
+    state = {}
+    for name, raw in zip(names, r.hmget(SOURCE_STATE_KEY, names) if names else []):
+        try:
+            state[name] = json.loads(raw) if raw else {}
+        except json.JSONDecodeError:
+            state[name] = {}
+    return state
+
+
+def schedule(sources, state, now=None):
+    """
+    The sources due for a fetch, in fetch order: by `priority`, then by
+    recent activity (moving average of new articles per fetch), then in
+    registry order.
+    """
+    now = time.time() if now is None else now
+    due = [
+        (position, source) for position, source in enumerate(sources)
+        if now - state.get(source.name, {}).get("last_run", 0) >= source.interval - SCHEDULE_SLACK
+    ]
+    due.sort(key=lambda pair: (-pair[1].priority, -state.get(pair[1].name, {}).get("activity", 0.0), pair[0]))
+    return [source for _, source in due]
+
+
+def record_fetches(r, state, new_articles, now=None):
+    """
+    Store the fetch time and updated activity of every source in
+    `new_articles` (`{name: articles published since its previous fetch}`).
+    """
+    if not new_articles:
+        return
+    now = time.time() if now is None else now
+    mapping = {}
+    for name, count in new_articles.items():
+        previous = state.get(name, {})
+        activity = previous.get("activity", count) * ACTIVITY_DECAY + count * (1 - ACTIVITY_DECAY)
+        mapping[name] = json.dumps({"last_run": now, "activity": round(activity, 3), "articles": count})
+    r.hset(SOURCE_STATE_KEY, mapping=mapping)
+
+
+def _parse_assignment(assignment):
+    key, _, value = assignment.partition("=")
+    try:
+        return key, json.loads(value)
+    except json.JSONDecodeError:
+        return key, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--include-disabled", action="store_true", help="list disabled sources too")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show the merged registry and each source's schedule state")
+    set_parser = sub.add_parser("set", help="add or override fields of a source in Redis")
+    set_parser.add_argument("name")
+    set_parser.add_argument("fields", nargs="+", metavar="FIELD=VALUE", help=f"one of {', '.join(FIELD_TYPES)}")
+    unset_parser = sub.add_parser("unset", help="drop the Redis override of a source")
+    unset_parser.add_argument("name")
+    args = parser.parse_args()
+
+    try:
+        r = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        r.ping()
+    except redis.ConnectionError:
+        logging.error("Redis not running! Start Redis first.")
+        return 1
+
+    if args.command == "set":
+        raw = r.hget(SOURCES_KEY, args.name)
+        values = {**(json.loads(raw) if raw else {}), **dict(_parse_assignment(a) for a in args.fields)}
+        defaults, entries = _read_file(SOURCES_FILE)
+        try:
+            make_source(args.name, {**entries.get(args.name, defaults), **values})
+        except (TypeError, ValueError) as e:
+            logging.error(f"Invalid source: {e}")
+            return 1
+        r.hset(SOURCES_KEY, args.name, json.dumps(values))
+        logging.info(f"Source '{args.name}' override: {values}")
+    elif args.command == "unset":
+        r.hdel(SOURCES_KEY, args.name)
+        logging.info(f"Source '{args.name}' override removed.")
+    else:
+        registry = load_sources(r, include_disabled=args.include_disabled)
+        state = load_state(r, registry)
+        for source in registry:
+            print(json.dumps({**asdict(source), "state": state.get(source.name, {})}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class PhaseTimer:
+    """
+    Wall-clock time per named phase of one scraper run.
+
+    With a `job` name every phase is also recorded as a stage span in
+    `metrics`, so it shows up on /metrics and in the run summary.
+    """
+
+    def __init__(self, job=None):
+        self.job = job
+        self.phases = {}
+        self._lock = threading.Lock()  # pipeline stages record from several threads
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+        if self.job:
+            metrics.record_stage(self.job, name, seconds)
+
+    def total(self):
+        return sum(self.phases.values())
+
+    def summary(self):
+        return ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.phases.items())
+
+    def log(self, label="Phase timings"):
+        logging.info(f"{label}: {self.summary()} (total {self.total():.2f}s)")